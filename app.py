@@ -1,16 +1,40 @@
-from typing import List, Optional
-from fastapi import FastAPI, HTTPException, status, Depends
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+from fastapi import FastAPI, HTTPException, status, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.background import BackgroundTask
 from datetime import datetime
-from sqlalchemy import select, delete, update
+from sqlalchemy import select, insert, delete, update, tuple_, bindparam, func, literal_column
 from sqlalchemy.exc import SQLAlchemyError
-from models import Todo, TodoCreate, TodoUpdate, User, AuthUser
-from database import db, TodoDB
-from auth import get_current_user
+from pydantic import TypeAdapter, ValidationError
+from models import (
+    Todo, TodoCreate, TodoUpdate, User, AuthUser,
+    TodoBatchCreate, TodoBatchUpdate, TodoBatchDelete, TodoBatchResult, TodoBatchResponse,
+    TodoImportError, TodoImportSummary, TodoChanges, TodoStats, SlowQuery,
+)
+from database import (
+    db, TodoDB, TodoTombstoneDB, todos_fts, search_user_token,
+    bump_todo_version, bulk_todo_stats, get_todo_version, get_todo_versions, get_todo_stats, get_todo_sync_state,
+    prune_tombstones, record_tombstones, tombstone_cutoff, TOMBSTONE_PRUNE_INTERVAL,
+)
+from auth import get_admin_user, get_current_user, user_syncer, validator
+from events import broker, event_stream
+from cache import list_cache
+from compression import CompressionMiddleware, compressed_cache
+from metrics import MetricsMiddleware, PROMETHEUS_CONTENT_TYPE, registry
+from timing import ServerTimingMiddleware, phase
+from slow_queries import slow_query_log
 import logging
 from contextlib import asynccontextmanager
 import os
 import asyncio
+import base64
+import binascii
+import codecs
+import csv
+import hashlib
+import io
+import json
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -20,6 +44,47 @@ logger = logging.getLogger(__name__)
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "*").split(",")
 CORS_ORIGINS = [o.strip() for o in CORS_ORIGINS if o.strip()] or ["*"]
 
+# Pagination
+DEFAULT_PAGE_SIZE = int(os.getenv("TODOS_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("TODOS_MAX_PAGE_SIZE", "500"))
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# Let browsers keep list pages but revalidate them with If-None-Match every time
+LIST_CACHE_CONTROL = "private, no-cache"
+
+# Export
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "500"))
+EXPORT_FIELDS = ["id", "title", "description", "completed", "created_at", "updated_at"]
+
+# Import
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+IMPORT_MAX_LINE_LENGTH = 64 * 1024
+IMPORT_MAX_ERRORS = 100
+
+# List views: name -> (completed filter, sort column). Every view is ordered
+# by (sort column, id) descending so that keyset pagination is stable.
+TODO_VIEWS = {
+    "all": (None, TodoDB.created_at),
+    "active": (False, TodoDB.created_at),
+    "completed": (True, TodoDB.updated_at),
+}
+
+# List pages are read as plain rows of the response columns and serialized in bulk
+TODO_LIST_COLUMNS = (
+    TodoDB.id, TodoDB.title, TodoDB.description, TodoDB.completed,
+    TodoDB.created_at, TodoDB.updated_at,
+)
+TODO_LIST_ADAPTER = TypeAdapter(List[Todo])
+TODO_CHANGES_ADAPTER = TypeAdapter(TodoChanges)
+
+# Search: rank weights for todos_fts (user_token, title, description).
+# The user token only narrows the match, so it does not contribute to the rank.
+SEARCH_MAX_QUERY_LENGTH = 200
+SEARCH_WEIGHTS = (0.0, 2.0, 1.0)
+# BM25's k1: hits in one column count less the more there already are
+SEARCH_SATURATION = 1.2
+# Inserted by highlight() before every hit, so hits = marked length - plain length
+SEARCH_HIT_MARKER = "\x01"
+
 
 def validate_todo_id(todo_id: int) -> None:
     """Validate that todo_id is a positive integer"""
@@ -30,12 +95,246 @@ def validate_todo_id(todo_id: int) -> None:
         )
 
 
+def encode_cursor(view: str, sort_value: Union[datetime, float, int], todo_id: int) -> str:
+    """Encode the position after a todo as an opaque pagination cursor"""
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([view, sort_value, todo_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(view: str, cursor: str) -> Tuple[Union[datetime, float, int], int]:
+    """Decode a pagination cursor issued for the given view"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_view, sort_value, todo_id = json.loads(base64.urlsafe_b64decode(padded))
+        if cursor_view != view or not isinstance(todo_id, int):
+            raise ValueError("cursor does not belong to this view")
+        if isinstance(sort_value, (float, int)):
+            return sort_value, todo_id
+        return datetime.fromisoformat(sort_value), todo_id
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def build_list_query(user_id: str, view: str, limit: int, cursor: Optional[str] = None):
+    """Build the keyset-paginated query for one of the todo list views.
+
+    Only the response columns are selected, as plain rows rather than ORM
+    objects. One extra row beyond ``limit`` is selected so the caller can
+    tell whether another page exists.
+    """
+    completed, sort_column = TODO_VIEWS[view]
+    query = select(*TODO_LIST_COLUMNS).where(TodoDB.user_id == user_id)
+    if completed is not None:
+        query = query.where(TodoDB.completed == completed)
+    if cursor is not None:
+        sort_value, todo_id = decode_cursor(view, cursor)
+        query = query.where(tuple_(sort_column, TodoDB.id) < tuple_(sort_value, todo_id))
+    return query.order_by(sort_column.desc(), TodoDB.id.desc()).limit(limit + 1)
+
+
+def build_search_match(user_id: str, q: str) -> Optional[str]:
+    """Translate free text into an FTS5 query over one user's todos: every word
+    must appear in the title or description, the last one as a prefix so that
+    partially typed queries match.
+
+    Only the last word is a prefix because FTS5 has to merge the doclists of
+    every term a prefix expands to, which dominates search time on large
+    tables.
+    """
+    def quote(text: str) -> str:
+        return '"' + text.replace('"', '""') + '"'
+    
+    terms = [quote(word) for word in q.split() if any(char.isalnum() for char in word)]
+    if not terms:
+        return None
+    terms[-1] += "*"
+    words = " AND ".join(terms)
+    return f"user_token : {search_user_token(user_id)} AND {{title description}} : ({words})"
+
+
+def search_column_hits(index: int, text):
+    """Count the query's hits in one todos_fts column of the current match"""
+    marked = func.highlight(literal_column("todos_fts"), index, SEARCH_HIT_MARKER, "")
+    return func.length(func.coalesce(marked, "")) - func.length(func.coalesce(text, ""))
+
+
+def build_search_query(user_id: str, q: str, limit: int, cursor: Optional[str] = None):
+    """Build the keyset-paginated full-text search query, best match first.
+
+    The rank is BM25's saturated, weighted term frequency computed from the
+    todo's own title and description only. bm25() itself also uses the
+    document count and average length of the whole index, so every write by
+    any user would move every score and shift the pages behind a cursor.
+    Like ``updated_at`` in the list views, a todo's rank only changes when
+    the todo does. One extra row beyond ``limit`` is selected so the caller
+    can tell whether another page exists.
+    """
+    match = build_search_match(user_id, q)
+    if match is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Search query has no searchable terms"
+        )
+    hits = (
+        select(
+            *TODO_LIST_COLUMNS,
+            search_column_hits(1, TodoDB.title).label("title_hits"),
+            search_column_hits(2, TodoDB.description).label("description_hits"),
+        )
+        .select_from(todos_fts)
+        .join(TodoDB, TodoDB.id == todos_fts.c.rowid)
+        .where(literal_column("todos_fts").op("MATCH")(match), TodoDB.user_id == user_id)
+        .subquery("hits")
+    )
+    # Negated so the best match sorts first, as with bm25()
+    score = -(
+        SEARCH_WEIGHTS[1] * hits.c.title_hits / (hits.c.title_hits + SEARCH_SATURATION)
+        + SEARCH_WEIGHTS[2] * hits.c.description_hits / (hits.c.description_hits + SEARCH_SATURATION)
+    )
+    query = select(*(hits.c[column.name] for column in TODO_LIST_COLUMNS), score.label("score"))
+    if cursor is not None:
+        sort_value, todo_id = decode_cursor(f"search:{q}", cursor)
+        query = query.where(tuple_(score, hits.c.id) > tuple_(sort_value, todo_id))
+    return query.order_by(score, hits.c.id).limit(limit + 1)
+
+
+def build_changes_query(
+    user_id: str, since: Optional[int], limit: int,
+    position: Optional[Tuple[int, int]] = None, deleted: bool = False,
+):
+    """Build the change feed query for a user's todos, or with ``deleted`` their tombstones.
+
+    Rows come in (version, id) order after ``since`` and the decoded cursor
+    ``position``, with one extra row beyond ``limit`` like the list queries.
+    """
+    model = TodoTombstoneDB if deleted else TodoDB
+    columns = (TodoTombstoneDB.id, TodoTombstoneDB.version) if deleted else (*TODO_LIST_COLUMNS, TodoDB.version)
+    query = select(*columns).where(model.user_id == user_id)
+    if since is not None:
+        query = query.where(model.version > since)
+    if position:
+        query = query.where(tuple_(model.version, model.id) > tuple_(*position))
+    return query.order_by(model.version, model.id).limit(limit + 1)
+
+
+def render_todo_list(rows) -> bytes:
+    """Validate and serialize rows as a JSON list of todos in one pass.
+
+    The output is byte-identical to rendering each row through
+    Todo.model_validate and JSONResponse.
+    """
+    with phase("serialize"):
+        return TODO_LIST_ADAPTER.dump_json(TODO_LIST_ADAPTER.validate_python(rows, from_attributes=True))
+
+
+def make_list_etag(user_id: str, view: str, limit: int, cursor: Optional[str], version: int) -> str:
+    """Build a strong ETag for one page of a list view at a given todo version"""
+    key = f"{user_id}|{view}|{limit}|{cursor or ''}|{version}"
+    return '"' + hashlib.sha256(key.encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Check an If-None-Match header against an ETag (weak comparison, RFC 9110)"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+async def list_todos(
+    request: Request, user_id: str, view: str, limit: int, cursor: Optional[str]
+) -> Response:
+    """Serve one page of a list view from the cache or the database, answering 304 if the client's copy is current"""
+    key = (view, limit, cursor)
+    cached = list_cache.get(user_id, key)
+    if cached is not None:
+        if etag_matches(request, cached.headers["ETag"]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cached.headers)
+        return Response(cached.body, media_type="application/json", headers=cached.headers)
+
+    query = build_list_query(user_id, view, limit, cursor)
+    token = list_cache.begin_read(user_id)
+    async with db.read_session() as session:
+        # Read the version before the rows: a concurrent write can only make
+        # the page newer than its ETag, which the next request then refetches.
+        version = await get_todo_version(session, user_id)
+        etag = make_list_etag(user_id, view, limit, cursor, version)
+        headers = {"ETag": etag, "Cache-Control": LIST_CACHE_CONTROL}
+        if etag_matches(request, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        result = await session.execute(query)
+        todos = result.all()
+
+    if len(todos) > limit:
+        todos = todos[:limit]
+        last = todos[-1]
+        _, sort_column = TODO_VIEWS[view]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            view, getattr(last, sort_column.key), last.id
+        )
+    response = Response(render_todo_list(todos), media_type="application/json", headers=headers)
+    list_cache.put(user_id, key, response.body, headers, token, version)
+    return response
+
+
+def publish_changes(
+    user_id: str,
+    version: int,
+    created: List[Todo] = (),
+    updated: List[Todo] = (),
+    deleted: List[int] = (),
+    resync: bool = False,
+) -> None:
+    """Propagate committed writes: drop cached list pages and notify open change streams"""
+    list_cache.invalidate_user(user_id)
+    if resync:
+        broker.publish(user_id, {"type": "resync", "version": version})
+    for event_type, todos in (("created", created), ("updated", updated)):
+        for todo in todos:
+            broker.publish(user_id, {"type": event_type, "version": version, "todo": todo.model_dump(mode="json")})
+    for todo_id in deleted:
+        broker.publish(user_id, {"type": "deleted", "version": version, "id": todo_id})
+
+
+async def load_todo_versions(user_ids: List[str]) -> Dict[str, int]:
+    """Current todo versions of the given users, for the cross-process polls of the broker and list cache"""
+    async with db.read_session() as session:
+        return await get_todo_versions(session, user_ids)
+
+
+async def prune_tombstones_periodically(interval: float) -> None:
+    """Drop tombstones older than TOMBSTONE_RETENTION_DAYS every `interval` seconds"""
+    while True:
+        try:
+            pruned = await db.write(lambda session: prune_tombstones(session, tombstone_cutoff()))
+            if pruned:
+                logger.info(f"Pruned {pruned} expired tombstones")
+        except SQLAlchemyError as e:
+            logger.error(f"Failed to prune tombstones: {e}")
+        await asyncio.sleep(interval)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
     # Startup
     try:
         await db.create_tables()
+        user_syncer.start()
+        broker.start_polling(load_todo_versions)
+        list_cache.start_polling(load_todo_versions)
+        pruner = (
+            asyncio.create_task(prune_tombstones_periodically(TOMBSTONE_PRUNE_INTERVAL))
+            if TOMBSTONE_PRUNE_INTERVAL > 0 else None
+        )
         logger.info("Application started successfully")
     except Exception as e:
         logger.error(f"Failed to initialize application: {e}")
@@ -45,6 +344,15 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Application shutting down")
+    await broker.stop_polling()
+    await list_cache.stop_polling()
+    if pruner is not None:
+        pruner.cancel()
+        try:
+            await pruner
+        except asyncio.CancelledError:
+            pass
+    await user_syncer.stop()
     await db.dispose()
 
 
@@ -61,7 +369,43 @@ app.add_middleware(
     allow_credentials=CORS_ORIGINS != ["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Server-Timing"],
+)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(ServerTimingMiddleware)
+# Outermost, so request latency includes compression
+app.add_middleware(MetricsMiddleware)
+
+
+def _pool_samples():
+    pools = {"primary": db.engine.pool}
+    if db.read_engine is not db.engine:
+        pools["read"] = db.read_engine.pool
+    return [({"pool": name}, pool.checkedout()) for name, pool in pools.items()]
+
+
+def _cache_samples(field: str):
+    return lambda: [
+        ({"cache": "list"}, getattr(list_cache, field)),
+        ({"cache": "token"}, getattr(validator, f"cache_{field}")),
+        ({"cache": "compressed"}, getattr(compressed_cache, field)),
+    ]
+
+
+# Components that keep their own counters are read at scrape time
+registry.add_collector("cache_hits_total", "Cache hits by cache", _cache_samples("hits"), kind="counter")
+registry.add_collector("cache_misses_total", "Cache misses by cache", _cache_samples("misses"), kind="counter")
+registry.add_collector("db_pool_checked_out", "Pooled connections currently checked out", _pool_samples)
+registry.add_collector(
+    "write_queue_batches_total", "Group commits by the single writer",
+    lambda: [({}, db.writer.batches)], kind="counter",
+)
+registry.add_collector(
+    "write_queue_operations_total", "Write operations committed by the single writer",
+    lambda: [({}, db.writer.operations)], kind="counter",
 )
+registry.add_collector("user_sync_pending", "User updates queued for the next flush", lambda: [({}, user_syncer.pending_count)])
+registry.add_collector("todo_stream_subscribers", "Open change streams", lambda: [({}, broker.subscriber_count)])
 
 
 @app.get("/", response_model=dict)
@@ -86,17 +430,15 @@ async def get_user_info(current_user: AuthUser = Depends(get_current_user)):
 
 
 @app.get("/todos", response_model=List[Todo])
-async def get_todos(current_user: AuthUser = Depends(get_current_user)):
-    """Get all todos for the current user"""
+async def get_todos(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
+    current_user: AuthUser = Depends(get_current_user)
+):
+    """Get a page of todos for the current user, newest first"""
     try:
-        async with db.session() as session:
-            result = await session.execute(
-                select(TodoDB)
-                .where(TodoDB.user_id == current_user.id)
-                .order_by(TodoDB.created_at.desc())
-            )
-            todos = result.scalars().all()
-            return [Todo.model_validate(todo) for todo in todos]
+        return await list_todos(request, current_user.id, "all", limit, cursor)
     except SQLAlchemyError as e:
         logger.error(f"Database error in get_todos: {e}")
         raise HTTPException(
@@ -106,17 +448,15 @@ async def get_todos(current_user: AuthUser = Depends(get_current_user)):
 
 
 @app.get("/todos/completed", response_model=List[Todo])
-async def get_completed_todos(current_user: AuthUser = Depends(get_current_user)):
-    """Get all completed todos for the current user"""
+async def get_completed_todos(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
+    current_user: AuthUser = Depends(get_current_user)
+):
+    """Get a page of completed todos for the current user, most recently updated first"""
     try:
-        async with db.session() as session:
-            result = await session.execute(
-                select(TodoDB)
-                .where(TodoDB.completed == True, TodoDB.user_id == current_user.id)
-                .order_by(TodoDB.updated_at.desc())
-            )
-            todos = result.scalars().all()
-            return [Todo.model_validate(todo) for todo in todos]
+        return await list_todos(request, current_user.id, "completed", limit, cursor)
     except SQLAlchemyError as e:
         logger.error(f"Database error in get_completed_todos: {e}")
         raise HTTPException(
@@ -126,17 +466,15 @@ async def get_completed_todos(current_user: AuthUser = Depends(get_current_user)
 
 
 @app.get("/todos/active", response_model=List[Todo])
-async def get_active_todos(current_user: AuthUser = Depends(get_current_user)):
-    """Get all active (incomplete) todos for the current user"""
+async def get_active_todos(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
+    current_user: AuthUser = Depends(get_current_user)
+):
+    """Get a page of active (incomplete) todos for the current user, newest first"""
     try:
-        async with db.session() as session:
-            result = await session.execute(
-                select(TodoDB)
-                .where(TodoDB.completed == False, TodoDB.user_id == current_user.id)
-                .order_by(TodoDB.created_at.desc())
-            )
-            todos = result.scalars().all()
-            return [Todo.model_validate(todo) for todo in todos]
+        return await list_todos(request, current_user.id, "active", limit, cursor)
     except SQLAlchemyError as e:
         logger.error(f"Database error in get_active_todos: {e}")
         raise HTTPException(
@@ -145,12 +483,503 @@ async def get_active_todos(current_user: AuthUser = Depends(get_current_user)):
         )
 
 
+@app.get("/todos/stats", response_model=TodoStats)
+async def get_todo_stats_summary(current_user: AuthUser = Depends(get_current_user)):
+    """Get the current user's total, active and completed todo counts"""
+    try:
+        async with db.read_session() as session:
+            total, completed = await get_todo_stats(session, current_user.id)
+        return TodoStats(total=total, active=total - completed, completed=completed)
+    except SQLAlchemyError as e:
+        logger.error(f"Database error in get_todo_stats_summary: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve todo stats"
+        )
+
+
+@app.get("/todos/search", response_model=List[Todo])
+async def search_todos(
+    q: str = Query(..., min_length=1, max_length=SEARCH_MAX_QUERY_LENGTH, description="Words to find; each matches as a prefix"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
+    current_user: AuthUser = Depends(get_current_user)
+):
+    """Search the current user's todo titles and descriptions, best match first"""
+    query = build_search_query(current_user.id, q, limit, cursor)
+    try:
+        async with db.read_session() as session:
+            result = await session.execute(query)
+            todos = result.all()
+    except SQLAlchemyError as e:
+        logger.error(f"Database error in search_todos: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to search todos"
+        )
+    
+    headers = {}
+    if len(todos) > limit:
+        todos = todos[:limit]
+        last = todos[-1]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(f"search:{q}", last.score, last.id)
+    return Response(render_todo_list(todos), media_type="application/json", headers=headers)
+
+
+@app.get("/todos/changes", response_model=TodoChanges)
+async def get_todo_changes(
+    since: Optional[int] = Query(None, ge=0, description="sync_token from the previous call; omit for a full snapshot"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
+    current_user: AuthUser = Depends(get_current_user)
+):
+    """Get todos created, updated or deleted since a sync token, in (version, id) order"""
+    position = decode_cursor("changes", cursor) if cursor else None
+    try:
+        async with db.read_session() as session:
+            # Read the version first: anything written concurrently is
+            # returned again by the next call, never skipped
+            version, pruned_version = await get_todo_sync_state(session, current_user.id)
+            if since is not None and since > version:
+                raise HTTPException(
+                    status_code=status.HTTP_410_GONE,
+                    detail="Sync token is ahead of the server; fetch a full snapshot"
+                )
+            # Deletions after the position must all still have tombstones
+            resume_from = position[0] if position else since
+            if resume_from is not None and resume_from < pruned_version:
+                raise HTTPException(
+                    status_code=status.HTTP_410_GONE,
+                    detail="Sync token is older than the retained deletions; fetch a full snapshot"
+                )
+            
+            result = await session.execute(build_changes_query(current_user.id, since, limit, position))
+            changed = result.all()
+            
+            # A snapshot's first page has nothing to delete; its later pages
+            # carry deletions of todos the client may already have received
+            deleted = []
+            if since is not None or position:
+                result = await session.execute(
+                    build_changes_query(current_user.id, since, limit, position, deleted=True)
+                )
+                deleted = result.all()
+    except HTTPException:
+        raise
+    except SQLAlchemyError as e:
+        logger.error(f"Database error in get_todo_changes: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve todo changes"
+        )
+    
+    # Both lists are in (version, id) order; a page is the first `limit` of the two merged
+    page = sorted(
+        [(row.version, row.id, row) for row in changed] + [(row.version, row.id, None) for row in deleted],
+        key=lambda item: item[:2],
+    )
+    headers = {}
+    if len(page) > limit:
+        page = page[:limit]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor("changes", *page[-1][:2])
+    changed = [row for _, _, row in page if row is not None]
+    # An id reused by a newer todo is live again
+    changed_ids = {row.id for row in changed}
+    deleted = [todo_id for _, todo_id, row in page if row is None and todo_id not in changed_ids]
+    with phase("serialize"):
+        body = TODO_CHANGES_ADAPTER.dump_json(TODO_CHANGES_ADAPTER.validate_python(
+            {"changed": changed, "deleted": deleted, "sync_token": version}, from_attributes=True
+        ))
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@app.get("/todos/stream")
+async def stream_todo_changes(current_user: AuthUser = Depends(get_current_user)):
+    """Stream the current user's todo changes as server-sent events"""
+    async with db.read_session() as session:
+        version = await get_todo_version(session, current_user.id)
+    # Subscribe before returning so no write between now and the first read
+    # is missed; writes by other workers after `version` arrive as resync
+    subscription = broker.subscribe(current_user.id, version)
+    logger.info(f"Opened change stream for user: {current_user.id}")
+    return StreamingResponse(
+        event_stream(broker, current_user.id, subscription=subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # The generator's own cleanup never runs if the client disconnects
+        # before the first chunk; unsubscribing twice is harmless
+        background=BackgroundTask(broker.unsubscribe, subscription),
+    )
+
+
+@app.get("/todos/export")
+async def export_todos(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Export format: ndjson or csv"),
+    current_user: AuthUser = Depends(get_current_user)
+):
+    """Stream all todos for the current user as NDJSON or CSV"""
+    user_id = current_user.id
+
+    async def ndjson_chunks():
+        async for rows in db.stream_todos(user_id, EXPORT_CHUNK_SIZE):
+            yield "".join(Todo.model_validate(row).model_dump_json() + "\n" for row in rows)
+
+    async def csv_chunks():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_FIELDS)
+        async for rows in db.stream_todos(user_id, EXPORT_CHUNK_SIZE):
+            for row in rows:
+                writer.writerow([
+                    row.id, row.title, row.description or "", str(row.completed).lower(),
+                    row.created_at.isoformat(), row.updated_at.isoformat()
+                ])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    async def logged(chunks):
+        # The status line is already sent, so failures can only be logged
+        try:
+            async for chunk in chunks:
+                yield chunk
+        except SQLAlchemyError as e:
+            logger.error(f"Database error in export_todos for user {user_id}: {e}")
+            raise
+
+    if format == "csv":
+        media_type, body = "text/csv", csv_chunks()
+    else:
+        media_type, body = "application/x-ndjson", ndjson_chunks()
+    logger.info(f"Exporting todos as {format} for user: {user_id}")
+    return StreamingResponse(
+        logged(body),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="todos.{format}"'}
+    )
+
+
+async def iter_import_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, str]]:
+    """Split a streamed UTF-8 body into numbered lines without buffering it whole"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    line_no = 0
+    try:
+        async for chunk in chunks:
+            buffer += decoder.decode(chunk)
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                line_no += 1
+                yield line_no, line.rstrip("\r")
+            if len(buffer) > IMPORT_MAX_LINE_LENGTH:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"Line {line_no + 1} exceeds {IMPORT_MAX_LINE_LENGTH} characters"
+                )
+        buffer += decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Import body is not valid UTF-8 (after line {line_no})"
+        )
+    if buffer:
+        yield line_no + 1, buffer.rstrip("\r")
+
+
+async def iter_ndjson_records(lines: AsyncIterator[Tuple[int, str]]) -> AsyncIterator[Tuple[int, Any]]:
+    """Yield (line, record) pairs from NDJSON, where record is a dict or an error message"""
+    async for line_no, line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, f"Invalid JSON: {e}"
+            continue
+        yield line_no, record if isinstance(record, dict) else "Expected a JSON object"
+
+
+async def iter_csv_records(lines: AsyncIterator[Tuple[int, str]]) -> AsyncIterator[Tuple[int, Any]]:
+    """Yield (line, record) pairs from CSV with a header row, where record is a dict or an error message"""
+    header = None
+    pending: List[str] = []
+    start = 0
+    async for line_no, line in lines:
+        if not pending:
+            start = line_no
+        pending.append(line)
+        text = "\n".join(pending)
+        if text.count('"') % 2:
+            # Quoted field continues on the next line
+            continue
+        pending = []
+        if not text.strip():
+            continue
+        try:
+            values = next(csv.reader([text]))
+        except csv.Error as e:
+            yield start, f"Invalid CSV: {e}"
+            continue
+        if header is None:
+            header = values
+            if "title" not in header:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="CSV header must include a title column"
+                )
+            continue
+        # Empty cells fall back to the field defaults
+        yield start, {key: value for key, value in zip(header, values) if value != ""}
+    if pending:
+        yield start, "Invalid CSV: unterminated quoted field"
+
+
+@app.post("/todos/import", response_model=TodoImportSummary)
+async def import_todos(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Import format: ndjson or csv"),
+    current_user: AuthUser = Depends(get_current_user)
+):
+    """Create todos for the current user from a streamed NDJSON or CSV body"""
+    lines = iter_import_lines(request.stream())
+    records = iter_csv_records(lines) if format == "csv" else iter_ndjson_records(lines)
+    imported = 0
+    errors: List[TodoImportError] = []
+    failed = 0
+    rows: List[dict] = []
+
+    async def insert_chunk():
+        nonlocal imported
+        current_time = datetime.now()
+        for row in rows:
+            row["created_at"] = current_time
+            row["updated_at"] = current_time
+        async def operation(session):
+            version = await bump_todo_version(session, current_user.id)
+            for row in rows:
+                row["version"] = version
+            async with bulk_todo_stats(session, current_user.id, rows):
+                await session.execute(insert(TodoDB.__table__), rows)
+            return version
+        
+        version = await db.write(operation)
+        # Rows are inserted without RETURNING, so streams are told to refetch
+        publish_changes(current_user.id, version, resync=True)
+        imported += len(rows)
+        rows.clear()
+
+    try:
+        async for line_no, record in records:
+            try:
+                if isinstance(record, str):
+                    raise ValueError(record)
+                todo = TodoCreate.model_validate(record)
+            except ValidationError as e:
+                error = e.errors()[0]
+                location = ".".join(str(part) for part in error["loc"])
+                detail = f"{location}: {error['msg']}" if location else error["msg"]
+                failed += 1
+                if len(errors) < IMPORT_MAX_ERRORS:
+                    errors.append(TodoImportError(line=line_no, detail=detail))
+                continue
+            except ValueError as e:
+                failed += 1
+                if len(errors) < IMPORT_MAX_ERRORS:
+                    errors.append(TodoImportError(line=line_no, detail=str(e)))
+                continue
+            rows.append({
+                "user_id": current_user.id,
+                "title": todo.title,
+                "description": todo.description,
+                "completed": todo.completed,
+            })
+            if len(rows) >= IMPORT_CHUNK_SIZE:
+                await insert_chunk()
+        if rows:
+            await insert_chunk()
+    except HTTPException as e:
+        # A bad body found mid-stream (an over-long line, invalid UTF-8, a CSV
+        # without a title column) leaves the chunks before it committed
+        logger.warning(f"Rejected import body for user {current_user.id} after {imported} rows: {e.detail}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=f"{e.detail}; {imported} todos were imported before the error"
+        )
+    except SQLAlchemyError as e:
+        logger.error(f"Database error in import_todos after {imported} rows: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to import todos; {imported} todos were imported before the error"
+        )
+
+    logger.info(f"Imported {imported} todos ({failed} rejected) for user: {current_user.id}")
+    return TodoImportSummary(imported=imported, failed=failed, errors=errors)
+
+
+@app.post("/todos/batch", response_model=TodoBatchResponse, status_code=status.HTTP_201_CREATED)
+async def create_todos_batch(batch: TodoBatchCreate, current_user: AuthUser = Depends(get_current_user)):
+    """Create several todos for the current user in one transaction"""
+    try:
+        current_time = datetime.now()
+        rows = [
+            {
+                "user_id": current_user.id,
+                "title": item.title,
+                "description": item.description,
+                "completed": item.completed,
+                "created_at": current_time,
+                "updated_at": current_time,
+            }
+            for item in batch.items
+        ]
+        
+        async def operation(session):
+            version = await bump_todo_version(session, current_user.id)
+            for row in rows:
+                row["version"] = version
+            async with bulk_todo_stats(session, current_user.id, rows):
+                result = await session.scalars(
+                    insert(TodoDB).returning(TodoDB, sort_by_parameter_order=True),
+                    rows
+                )
+                todos = [Todo.model_validate(todo) for todo in result.all()]
+            return version, todos
+        
+        version, todos = await db.write(operation)
+        logger.info(f"Created {len(todos)} todos in batch for user: {current_user.id}")
+        publish_changes(current_user.id, version, created=todos)
+        
+        return TodoBatchResponse(results=[
+            TodoBatchResult(id=todo.id, status=status.HTTP_201_CREATED, todo=todo)
+            for todo in todos
+        ])
+    except SQLAlchemyError as e:
+        logger.error(f"Database error in create_todos_batch: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to create todos"
+        )
+
+
+@app.patch("/todos/batch", response_model=TodoBatchResponse)
+async def update_todos_batch(batch: TodoBatchUpdate, current_user: AuthUser = Depends(get_current_user)):
+    """Update several todos for the current user in one transaction"""
+    ids = [item.id for item in batch.items]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Each todo may appear only once per batch"
+        )
+    try:
+        async def operation(session):
+            result = await session.execute(
+                select(TodoDB.id)
+                .where(TodoDB.user_id == current_user.id, TodoDB.id.in_(ids))
+            )
+            owned = set(result.scalars().all())
+            version = None
+            if owned:
+                version = await bump_todo_version(session, current_user.id)
+            
+            # Items setting the same fields share one executemany statement
+            current_time = datetime.now()
+            groups = {}
+            for item in batch.items:
+                if item.id not in owned:
+                    continue
+                values = item.model_dump(exclude_unset=True, exclude={"id"})
+                values["updated_at"] = current_time
+                values["version"] = version
+                params = {f"new_{field}": value for field, value in values.items()}
+                params["todo_id"] = item.id
+                groups.setdefault(tuple(sorted(values)), []).append(params)
+            
+            table = TodoDB.__table__
+            for fields, params in groups.items():
+                await session.execute(
+                    update(table)
+                    .where(table.c.id == bindparam("todo_id"), table.c.user_id == current_user.id)
+                    .values({field: bindparam(f"new_{field}") for field in fields}),
+                    params
+                )
+            
+            result = await session.execute(select(TodoDB).where(TodoDB.id.in_(owned)))
+            return version, {todo.id: Todo.model_validate(todo) for todo in result.scalars().all()}
+        
+        version, todos = await db.write(operation)
+        logger.info(f"Updated {len(todos)} todos in batch for user: {current_user.id}")
+        if todos:
+            publish_changes(current_user.id, version, updated=list(todos.values()))
+        
+        return TodoBatchResponse(results=[
+            TodoBatchResult(id=todo_id, status=status.HTTP_200_OK, todo=todos[todo_id])
+            if todo_id in todos else
+            TodoBatchResult(id=todo_id, status=status.HTTP_404_NOT_FOUND, detail=f"Todo with id {todo_id} not found")
+            for todo_id in ids
+        ])
+    except ValueError as e:
+        logger.error(f"Validation error in update_todos_batch: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except SQLAlchemyError as e:
+        logger.error(f"Database error in update_todos_batch: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to update todos"
+        )
+
+
+@app.delete("/todos/batch", response_model=TodoBatchResponse)
+async def delete_todos_batch(batch: TodoBatchDelete, current_user: AuthUser = Depends(get_current_user)):
+    """Delete several todos for the current user in one transaction"""
+    if len(set(batch.ids)) != len(batch.ids):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Each todo may appear only once per batch"
+        )
+    try:
+        async def operation(session):
+            result = await session.execute(
+                delete(TodoDB)
+                .where(TodoDB.user_id == current_user.id, TodoDB.id.in_(batch.ids))
+                .returning(TodoDB.id)
+            )
+            deleted = set(result.scalars().all())
+            version = None
+            if deleted:
+                version = await bump_todo_version(session, current_user.id)
+                await record_tombstones(session, current_user.id, list(deleted), version)
+            return version, deleted
+        
+        version, deleted = await db.write(operation)
+        logger.info(f"Deleted {len(deleted)} todos in batch for user: {current_user.id}")
+        if deleted:
+            publish_changes(current_user.id, version, deleted=sorted(deleted))
+        
+        return TodoBatchResponse(results=[
+            TodoBatchResult(id=todo_id, status=status.HTTP_204_NO_CONTENT)
+            if todo_id in deleted else
+            TodoBatchResult(id=todo_id, status=status.HTTP_404_NOT_FOUND, detail=f"Todo with id {todo_id} not found")
+            for todo_id in batch.ids
+        ])
+    except SQLAlchemyError as e:
+        logger.error(f"Database error in delete_todos_batch: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to delete todos"
+        )
+
+
 @app.get("/todos/{todo_id}", response_model=Todo)
 async def get_todo(todo_id: int, current_user: AuthUser = Depends(get_current_user)):
     """Get a specific todo by ID for the current user"""
     validate_todo_id(todo_id)
     try:
-        async with db.session() as session:
+        async with db.read_session() as session:
             result = await session.execute(
                 select(TodoDB)
                 .where(TodoDB.id == todo_id, TodoDB.user_id == current_user.id)
@@ -163,7 +992,8 @@ async def get_todo(todo_id: int, current_user: AuthUser = Depends(get_current_us
                     detail=f"Todo with id {todo_id} not found"
                 )
             
-            return Todo.model_validate(todo)
+            with phase("serialize"):
+                return Todo.model_validate(todo)
     except HTTPException:
         raise
     except SQLAlchemyError as e:
@@ -180,21 +1010,27 @@ async def create_todo(todo: TodoCreate, current_user: AuthUser = Depends(get_cur
     try:
         current_time = datetime.now()
         
-        new_todo = TodoDB(
-            user_id=current_user.id,
-            title=todo.title,
-            description=todo.description,
-            completed=todo.completed,
-            created_at=current_time
-        )
+        async def operation(session):
+            version = await bump_todo_version(session, current_user.id)
+            created = await session.scalar(
+                insert(TodoDB)
+                .values(
+                    user_id=current_user.id,
+                    title=todo.title,
+                    description=todo.description,
+                    completed=todo.completed,
+                    created_at=current_time,
+                    updated_at=current_time,
+                    version=version,
+                )
+                .returning(TodoDB)
+            )
+            return version, Todo.model_validate(created)
         
-        async with db.session() as session:
-            session.add(new_todo)
-            await session.commit()
-            await session.refresh(new_todo)
-            logger.info(f"Created todo with id: {new_todo.id} for user: {current_user.id}")
-            
-            return Todo.model_validate(new_todo)
+        version, created = await db.write(operation)
+        logger.info(f"Created todo with id: {created.id} for user: {current_user.id}")
+        publish_changes(current_user.id, version, created=[created])
+        return created
             
     except ValueError as e:
         logger.error(f"Validation error in create_todo: {e}")
@@ -215,29 +1051,32 @@ async def update_todo(todo_id: int, todo_update: TodoUpdate, current_user: AuthU
     """Update an existing todo for the current user"""
     validate_todo_id(todo_id)
     try:
-        async with db.session() as session:
-            # Get existing todo with row lock to prevent race conditions
+        values = todo_update.model_dump(exclude_unset=True)
+        
+        async def operation(session):
+            version = await bump_todo_version(session, current_user.id)
             result = await session.execute(
-                select(TodoDB)
+                update(TodoDB)
                 .where(TodoDB.id == todo_id, TodoDB.user_id == current_user.id)
-                .with_for_update()
+                .values(**values, updated_at=datetime.now(), version=version)
+                .returning(TodoDB)
+                .execution_options(synchronize_session=False)
             )
             todo = result.scalar_one_or_none()
             
             if not todo:
+                # Raising rolls back the version bump with the savepoint
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail=f"Todo with id {todo_id} not found"
                 )
             
-            for field, value in todo_update.model_dump(exclude_unset=True).items():
-                setattr(todo, field, value)
-            
-            await session.commit()
-            await session.refresh(todo)
-            logger.info(f"Updated todo with id: {todo_id} for user: {current_user.id}")
-            
-            return Todo.model_validate(todo)
+            return version, Todo.model_validate(todo)
+        
+        version, updated = await db.write(operation)
+        logger.info(f"Updated todo with id: {todo_id} for user: {current_user.id}")
+        publish_changes(current_user.id, version, updated=[updated])
+        return updated
             
     except HTTPException:
         raise
@@ -260,25 +1099,28 @@ async def delete_todo(todo_id: int, current_user: AuthUser = Depends(get_current
     """Delete a todo for the current user"""
     validate_todo_id(todo_id)
     try:
-        async with db.session() as session:
+        async def operation(session):
             result = await session.execute(
-                select(TodoDB)
+                delete(TodoDB)
                 .where(TodoDB.id == todo_id, TodoDB.user_id == current_user.id)
-                .with_for_update()
+                .returning(TodoDB.id)
             )
-            todo = result.scalar_one_or_none()
             
-            if not todo:
+            if result.scalar_one_or_none() is None:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail=f"Todo with id {todo_id} not found"
                 )
             
-            await session.delete(todo)
-            await session.commit()
-            logger.info(f"Deleted todo with id: {todo_id} for user: {current_user.id}")
-            
-            return None
+            version = await bump_todo_version(session, current_user.id)
+            await record_tombstones(session, current_user.id, [todo_id], version)
+            return version
+        
+        version = await db.write(operation)
+        logger.info(f"Deleted todo with id: {todo_id} for user: {current_user.id}")
+        publish_changes(current_user.id, version, deleted=[todo_id])
+        
+        return None
             
     except HTTPException:
         raise
@@ -290,12 +1132,24 @@ async def delete_todo(todo_id: int, current_user: AuthUser = Depends(get_current
         )
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Process metrics in Prometheus text exposition format"""
+    return Response(registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@app.get("/admin/slow-queries", response_model=List[SlowQuery])
+async def list_slow_queries(admin: AuthUser = Depends(get_admin_user)):
+    """Statements this process ran over the slow query threshold, newest first"""
+    return slow_query_log.entries()
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint with database connection timeout"""
     try:
         async with asyncio.timeout(5.0):
-            async with db.session() as session:
+            async with db.read_session() as session:
                 result = await session.execute(select(TodoDB).limit(1))
                 result.scalar_one_or_none()
         return {"status": "healthy", "database": "connected", "timestamp": datetime.now()}
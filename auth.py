@@ -2,13 +2,16 @@ import os
 import httpx
 import time
 import asyncio
-from typing import Optional, Dict, Any
+import hashlib
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import jwt, JWTError
+from jose import jwk, jwt, JWTError
 from pydantic import BaseModel
 from models import AuthUser
-from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 import logging
 from dotenv import load_dotenv
@@ -18,6 +21,8 @@ load_dotenv()
 
 # Import database components
 from database import db, UserDB
+from metrics import jwks_refreshes, user_sync_writes
+from timing import phase
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +33,22 @@ if OIDC_ISSUER:
     OIDC_ISSUER = OIDC_ISSUER.rstrip("/")
 OIDC_AUDIENCE = os.getenv("OIDC_AUDIENCE")
 JWKS_URL = os.getenv("JWKS_URL")
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "1024"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_FLUSH_INTERVAL = float(os.getenv("USER_FLUSH_INTERVAL", "5"))
+LAST_LOGIN_INTERVAL = 300  # seconds between last_login updates per user
+# Users allowed on /admin endpoints, matched on the token's sub claim. The
+# email claim is not used: many providers let users set an unverified email.
+ADMIN_USER_IDS = {
+    user_id.strip() for user_id in os.getenv("ADMIN_USER_IDS", "").split(",") if user_id.strip()
+}
+
+# JWS algorithms accepted for JWKS keys. python-jose has no RSASSA-PSS,
+# so PS256/PS384/PS512 keys are skipped.
+SUPPORTED_ALGORITHMS = {"RS256", "RS384", "RS512", "ES256", "ES384", "ES512"}
+# Algorithm assumed for keys that do not name one
+DEFAULT_RSA_ALGORITHM = "RS256"
+EC_CURVE_ALGORITHMS = {"P-256": "ES256", "P-384": "ES384", "P-521": "ES512"}
 
 security = HTTPBearer()
 
@@ -35,12 +56,60 @@ class TokenValidator:
     """
     Handles JWT validation using JWKS from an OIDC provider.
     Includes caching and automatic discovery of JWKS URL.
+    Verified tokens are kept in a bounded LRU cache until their `exp` claim,
+    so repeated requests with the same token skip signature verification.
     """
-    def __init__(self):
+    def __init__(self, token_cache_size: int = TOKEN_CACHE_SIZE):
         self.jwks: Optional[Dict[str, Any]] = None
         self.jwks_last_fetched: float = 0
         self.jwks_ttl: int = 3600  # Cache JWKS for 1 hour
+        # kid -> (algorithm, public key), built once from the JWKS it came from
+        self._signing_keys: Dict[str, Tuple[str, Any]] = {}
+        self._signing_keys_source: Optional[Dict[str, Any]] = None
         self._lock = asyncio.Lock()
+        # sha256(token) -> (exp, payload), least recently used first
+        self._token_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.token_cache_size = token_cache_size
+        self.cache_hits: int = 0
+        self.cache_misses: int = 0
+
+    def cache_info(self) -> Dict[str, int]:
+        """Return hit/miss counters and current size of the verified-token cache"""
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "size": len(self._token_cache),
+            "maxsize": self.token_cache_size,
+        }
+
+    def clear_token_cache(self) -> None:
+        """Drop all verified tokens, e.g. after the signing keys changed"""
+        self._token_cache.clear()
+
+    def _get_cached_payload(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached payload for a token if present and not expired"""
+        entry = self._token_cache.get(cache_key)
+        if entry is None:
+            self.cache_misses += 1
+            return None
+        exp, payload = entry
+        if time.time() >= exp:
+            del self._token_cache[cache_key]
+            self.cache_misses += 1
+            return None
+        self._token_cache.move_to_end(cache_key)
+        self.cache_hits += 1
+        return payload
+
+    def _cache_payload(self, cache_key: str, payload: Dict[str, Any]) -> None:
+        """Store a verified payload until its exp claim, evicting the LRU entry"""
+        exp = payload.get("exp")
+        if self.token_cache_size <= 0 or not isinstance(exp, (int, float)):
+            return
+        self._token_cache[cache_key] = (float(exp), payload)
+        self._token_cache.move_to_end(cache_key)
+        while len(self._token_cache) > self.token_cache_size:
+            self._token_cache.popitem(last=False)
 
     async def _fetch_jwks_url(self) -> str:
         """
@@ -91,10 +160,16 @@ class TokenValidator:
                         async with httpx.AsyncClient() as client:
                             response = await client.get(jwks_url)
                             response.raise_for_status()
-                            self.jwks = response.json()
+                            jwks = response.json()
+                            if jwks != self.jwks:
+                                # Keys rotated: tokens verified with old keys must be re-checked
+                                self.clear_token_cache()
+                            self.jwks = jwks
                             self.jwks_last_fetched = now
+                            jwks_refreshes.inc("success")
                             logger.info("Successfully fetched and cached JWKS")
                     except Exception as e:
+                        jwks_refreshes.inc("failure")
                         if self.jwks:
                             logger.warning(f"Failed to refresh JWKS, using cached version: {e}")
                         else:
@@ -104,6 +179,38 @@ class TokenValidator:
         assert self.jwks is not None
         return self.jwks
 
+    def signing_keys(self, jwks: Dict[str, Any]) -> Dict[str, Tuple[str, Any]]:
+        """
+        Return the JWKS's signature keys as `kid -> (algorithm, key)`.
+
+        Public keys are parsed once per fetched JWKS instead of on every
+        token verification. Keys for encryption, of an unsupported
+        algorithm, or that fail to parse are left out.
+        """
+        if jwks is self._signing_keys_source:
+            return self._signing_keys
+        keys: Dict[str, Tuple[str, Any]] = {}
+        for key in jwks.get("keys", []):
+            kid = key.get("kid")
+            if kid is None or key.get("use", "sig") != "sig":
+                continue
+            algorithm = key.get("alg")
+            if algorithm is None:
+                if key.get("kty") == "RSA":
+                    algorithm = DEFAULT_RSA_ALGORITHM
+                elif key.get("kty") == "EC":
+                    algorithm = EC_CURVE_ALGORITHMS.get(key.get("crv"))
+            if algorithm not in SUPPORTED_ALGORITHMS:
+                logger.warning(f"Skipping JWKS key {kid}: unsupported algorithm {algorithm}")
+                continue
+            try:
+                keys[kid] = (algorithm, jwk.construct(key, algorithm))
+            except Exception as e:
+                logger.warning(f"Skipping JWKS key {kid}: {e}")
+        self._signing_keys = keys
+        self._signing_keys_source = jwks
+        return keys
+
     async def validate_token(self, token: str) -> Dict[str, Any]:
         """
         Validate JWT token against JWKS.
@@ -117,6 +224,11 @@ class TokenValidator:
         Raises:
             HTTPException: If token is invalid or expired.
         """
+        cache_key = hashlib.sha256(token.encode()).hexdigest()
+        cached = self._get_cached_payload(cache_key)
+        if cached is not None:
+            return cached
+
         try:
             jwks = await self.get_jwks()
             try:
@@ -132,45 +244,28 @@ class TokenValidator:
                 raise JWTError("Token header missing 'kid'")
             
             kid = unverified_header["kid"]
-            rsa_key = None
-            for key in jwks["keys"]:
-                if key["kid"] == kid:
-                    rsa_key = {
-                        "kty": key["kty"],
-                        "kid": key["kid"],
-                        "use": key["use"],
-                        "n": key["n"],
-                        "e": key["e"]
-                    }
-                    break
-            
-            if not rsa_key:
+            signing_key = self.signing_keys(jwks).get(kid)
+            if signing_key is None:
                 # If key not found, try refreshing JWKS once
                 async with self._lock:
                     self.jwks = None
                 jwks = await self.get_jwks()
-                for key in jwks["keys"]:
-                    if key["kid"] == kid:
-                        rsa_key = {
-                            "kty": key["kty"],
-                            "kid": key["kid"],
-                            "use": key["use"],
-                            "n": key["n"],
-                            "e": key["e"]
-                        }
-                        break
-            
-            if rsa_key:
-                payload = jwt.decode(
-                    token,
-                    rsa_key,
-                    algorithms=["RS256"],
-                    audience=OIDC_AUDIENCE,
-                    issuer=OIDC_ISSUER
-                )
-                return payload
-            
-            raise JWTError("Public key not found in JWKS")
+                signing_key = self.signing_keys(jwks).get(kid)
+            if signing_key is None:
+                raise JWTError("Public key not found in JWKS")
+
+            # Only the key's own algorithm is accepted, so a token cannot
+            # pick a different one for the same key
+            algorithm, key = signing_key
+            payload = jwt.decode(
+                token,
+                key,
+                algorithms=[algorithm],
+                audience=OIDC_AUDIENCE,
+                issuer=OIDC_ISSUER
+            )
+            self._cache_payload(cache_key, payload)
+            return payload
             
         except JWTError as e:
             logger.error(f"JWT validation error: {e}")
@@ -191,54 +286,160 @@ class TokenValidator:
 
 validator = TokenValidator()
 
+class UserSyncer:
+    """
+    Keeps the local users table in sync with identity claims without a
+    database round trip on every request.
+
+    Users already seen by this process are held in a bounded in-memory cache.
+    A first-seen user is upserted immediately so the todos.user_id foreign key
+    holds for their first write; profile changes and periodic last_login
+    updates are queued and written in batches by a background task.
+    """
+    def __init__(self, cache_size: int = USER_CACHE_SIZE, flush_interval: float = USER_FLUSH_INTERVAL):
+        # user_id -> ((email, name, picture), last_login queued at), least recently used first
+        self._known: "OrderedDict[str, Tuple[Tuple[str, Optional[str], Optional[str]], float]]" = OrderedDict()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending_count(self) -> int:
+        """Number of user rows waiting for the next flush"""
+        return len(self._pending)
+
+    def _remember(self, user: AuthUser, touched_at: float) -> None:
+        self._known[user.id] = ((user.email, user.name, user.picture), touched_at)
+        self._known.move_to_end(user.id)
+        while len(self._known) > self.cache_size:
+            self._known.popitem(last=False)
+
+    @staticmethod
+    def _row(user: AuthUser) -> Dict[str, Any]:
+        return {
+            "id": user.id,
+            "email": user.email,
+            "name": user.name,
+            "picture": user.picture,
+            "last_login": datetime.now(),
+        }
+
+    @staticmethod
+    async def _upsert(rows: List[Dict[str, Any]], kind: str) -> None:
+        stmt = sqlite_insert(UserDB).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserDB.id],
+            set_={
+                "email": stmt.excluded.email,
+                "name": stmt.excluded.name,
+                "picture": stmt.excluded.picture,
+                "last_login": stmt.excluded.last_login,
+            },
+        )
+
+        async def operation(session):
+            await session.execute(stmt)
+
+        # Through the single writer, so user syncs never contend with todo writes
+        await db.write(operation)
+        user_sync_writes.inc(kind, amount=len(rows))
+
+    async def sync(self, user: AuthUser) -> None:
+        """
+        Record that a user made a request.
+
+        Args:
+            user (AuthUser): The user information extracted from the JWT.
+        """
+        now = time.time()
+        known = self._known.get(user.id)
+        if known is None:
+            try:
+                await self._upsert([self._row(user)], "first_seen")
+                self._remember(user, now)
+                logger.debug(f"Synced first-seen user to database: {user.id}")
+            except Exception as e:
+                logger.error(f"Failed to sync user {user.id}: {e}")
+                # We don't raise here to not block the request if user sync fails,
+                # but in a production system with FK constraints, this might cause
+                # failures in subsequent DB operations.
+            return
+
+        profile, touched_at = known
+        # Only update if info changed or last_login is more than 5 minutes ago
+        if profile != (user.email, user.name, user.picture) or now - touched_at > LAST_LOGIN_INTERVAL:
+            self._pending[user.id] = self._row(user)
+            self._remember(user, now)
+        else:
+            self._known.move_to_end(user.id)
+
+    async def flush(self) -> int:
+        """
+        Write all queued profile and last_login updates in one batched upsert.
+
+        Returns:
+            int: The number of user rows written.
+        """
+        if not self._pending:
+            return 0
+        rows = list(self._pending.values())
+        self._pending.clear()
+        try:
+            await self._upsert(rows, "flush")
+        except IntegrityError:
+            # One bad row (e.g. an email now claimed by another account)
+            # must not drop everyone else's update
+            written = 0
+            for row in rows:
+                try:
+                    await self._upsert([row], "flush")
+                    written += 1
+                except Exception as e:
+                    logger.error(f"Failed to sync user {row['id']}: {e}")
+            return written
+        except Exception as e:
+            logger.error(f"Failed to flush {len(rows)} user updates, will retry: {e}")
+            for row in rows:
+                self._pending.setdefault(row["id"], row)
+            return 0
+        logger.debug(f"Flushed {len(rows)} user updates")
+        return len(rows)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self) -> None:
+        """Start the background write-behind task"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task and write any remaining updates"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+user_syncer = UserSyncer()
+
 async def sync_user(user: AuthUser) -> None:
     """
     Synchronize user information from the Identity Provider with the local database.
-    Creates a new user record if it doesn't exist, otherwise updates existing info.
+    Creates a new user record if it doesn't exist, otherwise queues changed info
+    and last_login for the background flush.
     
     Args:
         user (AuthUser): The user information extracted from the JWT.
     """
-    try:
-        async with db.session() as session:
-            result = await session.execute(select(UserDB).where(UserDB.id == user.id))
-            db_user = result.scalar_one_or_none()
-            
-            current_time = datetime.now()
-            
-            if not db_user:
-                db_user = UserDB(
-                    id=user.id,
-                    email=user.email,
-                    name=user.name,
-                    picture=user.picture,
-                    last_login=current_time
-                )
-                session.add(db_user)
-                await session.commit()
-                logger.info(f"Created new user in database: {user.id}")
-            else:
-                # Only update if info changed or last_login is more than 5 minutes ago
-                info_changed = (
-                    db_user.email != user.email or 
-                    db_user.name != user.name or 
-                    db_user.picture != user.picture
-                )
-                time_to_update = not db_user.last_login or (current_time - db_user.last_login).total_seconds() > 300
-                
-                if info_changed or time_to_update:
-                    db_user.email = user.email
-                    db_user.name = user.name
-                    db_user.picture = user.picture
-                    db_user.last_login = current_time
-                    await session.commit()
-                    logger.debug(f"Updated user info/last_login: {user.id}")
-                    
-    except Exception as e:
-        logger.error(f"Failed to sync user {user.id}: {e}")
-        # We don't raise here to not block the request if user sync fails,
-        # but in a production system with FK constraints, this might cause
-        # failures in subsequent DB operations.
+    await user_syncer.sync(user)
 
 async def get_current_user(token: HTTPAuthorizationCredentials = Depends(security)) -> AuthUser:
     """
@@ -261,7 +462,8 @@ async def get_current_user(token: HTTPAuthorizationCredentials = Depends(securit
             detail="SSO authentication not configured on server"
         )
 
-    payload = await validator.validate_token(token.credentials)
+    with phase("auth"):
+        payload = await validator.validate_token(token.credentials)
     
     user_id = payload.get("sub")
     email = payload.get("email")
@@ -280,6 +482,22 @@ async def get_current_user(token: HTTPAuthorizationCredentials = Depends(securit
     )
     
     # Sync user to database to ensure consistency and support foreign keys
-    await sync_user(user)
+    with phase("sync_user"):
+        await sync_user(user)
     
     return user
+
+
+async def get_admin_user(user: AuthUser = Depends(get_current_user)) -> AuthUser:
+    """
+    FastAPI dependency that admits only users whose id is listed in ADMIN_USER_IDS.
+
+    Raises:
+        HTTPException: 403 if the authenticated user is not an admin.
+    """
+    if user.id not in ADMIN_USER_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return user
@@ -0,0 +1,109 @@
+"""
+Measure POST /todos/import throughput in rows per second.
+
+A fresh SQLite database file is created and a generated NDJSON or CSV body is
+streamed through the app in fixed-size request chunks, with get_current_user
+overridden, so the run covers body parsing, validation, the chunked inserts
+through the write queue and the triggers on todos.
+
+Usage:
+    python benchmarks/bench_import.py [--rows 50000] [--format ndjson] [--chunk-size 1000] [--repeat 3]
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+USER_ID = "bench-user"
+BODY_CHUNK = 64 * 1024
+
+
+def render_rows(rows: int, format: str, offset: int) -> bytes:
+    """The request body: `rows` todos in the given import format"""
+    records = [
+        {"title": f"Imported todo {offset + i}", "description": f"Row {i} of the import benchmark", "completed": i % 3 == 0}
+        for i in range(rows)
+    ]
+    if format == "ndjson":
+        return "".join(json.dumps(record) + "\n" for record in records).encode()
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=["title", "description", "completed"])
+    writer.writeheader()
+    writer.writerows(records)
+    return buffer.getvalue().encode()
+
+
+async def stream(body: bytes):
+    for start in range(0, len(body), BODY_CHUNK):
+        yield body[start:start + BODY_CHUNK]
+
+
+async def main_async(args) -> dict:
+    from httpx import AsyncClient
+
+    import app as app_module
+    from app import app
+    from auth import get_current_user
+    from database import UserDB, db
+    from models import AuthUser
+
+    logging.getLogger().setLevel(logging.ERROR)
+    app_module.IMPORT_CHUNK_SIZE = args.chunk_size
+    user = AuthUser(id=USER_ID, email="bench@example.com")
+
+    async def override_get_current_user():
+        return user
+
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    await db.create_tables()
+
+    async def add_user(session):
+        session.add(UserDB(id=USER_ID, email=user.email))
+
+    await db.write(add_user)
+
+    runs = []
+    async with AsyncClient(app=app, base_url="http://bench", timeout=None) as client:
+        for run in range(args.repeat):
+            body = render_rows(args.rows, args.format, run * args.rows)
+            start = time.perf_counter()
+            response = await client.post("/todos/import", params={"format": args.format}, content=stream(body))
+            elapsed = time.perf_counter() - start
+            response.raise_for_status()
+            assert response.json()["imported"] == args.rows, response.json()
+            runs.append(args.rows / elapsed)
+    await db.dispose()
+
+    return {
+        "rows": args.rows,
+        "format": args.format,
+        "chunk_size": args.chunk_size,
+        "body_bytes": len(render_rows(args.rows, args.format, 0)),
+        "rows_per_sec": [round(rate, 1) for rate in runs],
+        "best_rows_per_sec": round(max(runs), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=50000, help="todos per import request")
+    parser.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="IMPORT_CHUNK_SIZE for the run")
+    parser.add_argument("--repeat", type=int, default=3, help="imports into the same, growing table")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        # The app's module-level Database reads DATABASE_URL when first imported
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{directory}/bench.db"
+        print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
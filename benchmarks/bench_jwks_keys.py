@@ -0,0 +1,97 @@
+"""
+Compare per-token signature verification cost with the JWKS key lookup the
+validator used to do (scan the key list for the kid, rebuild the RSA key dict
+and let jwt.decode parse it on every call) against the kid -> constructed key
+map built once per JWKS fetch. The verified-token cache is bypassed, so every
+iteration verifies a signature.
+
+Usage:
+    python benchmarks/bench_jwks_keys.py [--keys 4] [--repeat 2000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from cryptography.hazmat.primitives import serialization  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import ec, rsa  # noqa: E402
+from jose import jwk, jwt  # noqa: E402
+
+from auth import TokenValidator  # noqa: E402
+
+AUDIENCE = "bench-audience"
+ISSUER = "https://bench-issuer.example"
+
+
+def private_key(algorithm: str):
+    if algorithm == "RS256":
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    else:
+        key = ec.generate_private_key(ec.SECP256R1())
+    pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    return jwk.construct(pem, algorithm)
+
+
+def build_jwks(algorithm: str, count: int):
+    """JWKS with `count` keys; tokens are signed with the last one"""
+    keys = []
+    signer = None
+    for index in range(count):
+        signer = private_key(algorithm)
+        public = signer.public_key().to_dict()
+        public.update(kid=f"key-{index}", use="sig")
+        keys.append(public)
+    return {"keys": keys}, signer, f"key-{count - 1}"
+
+
+def previous_lookup(token: str, jwks: dict) -> dict:
+    """The RS256-only lookup validate_token used before the key map"""
+    kid = jwt.get_unverified_header(token)["kid"]
+    rsa_key = None
+    for key in jwks["keys"]:
+        if key["kid"] == kid:
+            rsa_key = {"kty": key["kty"], "kid": key["kid"], "use": key["use"], "n": key["n"], "e": key["e"]}
+            break
+    return jwt.decode(token, rsa_key, algorithms=["RS256"], audience=AUDIENCE, issuer=ISSUER)
+
+
+def keyed_lookup(validator: TokenValidator, token: str, jwks: dict) -> dict:
+    """The lookup validate_token does now"""
+    kid = jwt.get_unverified_header(token)["kid"]
+    algorithm, key = validator.signing_keys(jwks)[kid]
+    return jwt.decode(token, key, algorithms=[algorithm], audience=AUDIENCE, issuer=ISSUER)
+
+
+def measure(verify, repeat: int) -> float:
+    verify()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        verify()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--keys", type=int, default=4, help="keys in the JWKS")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    claims = {"sub": "bench-user", "aud": AUDIENCE, "iss": ISSUER, "exp": time.time() + 3600}
+    print(f"{'path':<28}{'us/verify':>12}")
+    for algorithm in ("RS256", "ES256"):
+        jwks, signer, kid = build_jwks(algorithm, args.keys)
+        token = jwt.encode(claims, signer, algorithm=algorithm, headers={"kid": kid})
+        validator = TokenValidator()
+        if algorithm == "RS256":
+            before = measure(lambda: previous_lookup(token, jwks), args.repeat)
+            print(f"{'RS256 scan + parse':<28}{before:>12.1f}")
+        after = measure(lambda: keyed_lookup(validator, token, jwks), args.repeat)
+        print(f"{algorithm + ' key map':<28}{after:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Compare CPU time and peak memory of rendering a todo list page through ORM
+objects, per-row Todo.model_validate and JSONResponse against the plain-row
+path used by the list endpoints (Core column select and one TypeAdapter pass).
+
+Usage:
+    python benchmarks/bench_list_serialization.py [--rows 1000] [--repeat 50]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from sqlalchemy import insert, select  # noqa: E402
+
+from app import TODO_LIST_COLUMNS, render_todo_list  # noqa: E402
+from database import Database, TodoDB, UserDB  # noqa: E402
+from models import Todo  # noqa: E402
+
+USER_ID = "bench-user"
+
+
+async def orm_page(db: Database, rows: int) -> bytes:
+    async with db.session() as session:
+        result = await session.execute(
+            select(TodoDB).where(TodoDB.user_id == USER_ID)
+            .order_by(TodoDB.created_at.desc(), TodoDB.id.desc()).limit(rows)
+        )
+        todos = result.scalars().all()
+    return JSONResponse(jsonable_encoder([Todo.model_validate(todo) for todo in todos])).body
+
+
+async def row_page(db: Database, rows: int) -> bytes:
+    async with db.session() as session:
+        result = await session.execute(
+            select(*TODO_LIST_COLUMNS).where(TodoDB.user_id == USER_ID)
+            .order_by(TodoDB.created_at.desc(), TodoDB.id.desc()).limit(rows)
+        )
+        todos = result.all()
+    return render_todo_list(todos)
+
+
+async def measure(db: Database, render, rows: int, repeat: int) -> dict:
+    cpu = time.process_time()
+    for _ in range(repeat):
+        await render(db, rows)
+    cpu = (time.process_time() - cpu) / repeat
+
+    tracemalloc.start()
+    await render(db, rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"cpu_ms": round(cpu * 1000, 2), "peak_kib": round(peak / 1024, 1)}
+
+
+async def main_async(args) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(url=f"sqlite+aiosqlite:///{directory}/bench.db")
+        await db.create_tables()
+        async with db.session() as session:
+            session.add(UserDB(id=USER_ID, email="bench@example.com"))
+            now = datetime.now()
+            await session.execute(insert(TodoDB), [
+                {"user_id": USER_ID, "title": f"Todo {i}", "description": "x" * 80,
+                 "created_at": now, "updated_at": now}
+                for i in range(args.rows)
+            ])
+            await session.commit()
+
+        assert await orm_page(db, args.rows) == await row_page(db, args.rows)
+        results = {
+            "rows": args.rows,
+            "orm": await measure(db, orm_page, args.rows, args.repeat),
+            "rows_typeadapter": await measure(db, row_page, args.rows, args.repeat),
+        }
+        await db.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
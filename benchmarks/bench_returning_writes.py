@@ -0,0 +1,143 @@
+"""
+Compare per-write latency of the ORM round-trip pattern with single-statement
+INSERT/UPDATE/DELETE ... RETURNING.
+
+The "orm" variant is what the single-todo endpoints used to do: add, commit and
+refresh on create; SELECT, flush, commit and refresh on update; SELECT, delete
+and commit on delete. The "returning" variant issues one statement per write
+and one commit.
+
+Usage:
+    python benchmarks/bench_returning_writes.py [--writes 2000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import delete, insert, select, update  # noqa: E402
+
+from database import Database, TodoDB, UserDB  # noqa: E402
+
+USER_ID = "bench-user"
+
+
+async def orm_create(session, i):
+    todo = TodoDB(user_id=USER_ID, title=f"Todo {i}", created_at=datetime.now())
+    session.add(todo)
+    await session.commit()
+    await session.refresh(todo)
+    return todo.id
+
+
+async def orm_update(session, todo_id):
+    result = await session.execute(
+        select(TodoDB).where(TodoDB.id == todo_id, TodoDB.user_id == USER_ID)
+    )
+    todo = result.scalar_one()
+    todo.completed = True
+    await session.commit()
+    await session.refresh(todo)
+
+
+async def orm_delete(session, todo_id):
+    result = await session.execute(
+        select(TodoDB).where(TodoDB.id == todo_id, TodoDB.user_id == USER_ID)
+    )
+    await session.delete(result.scalar_one())
+    await session.commit()
+
+
+async def returning_create(session, i):
+    todo = await session.scalar(
+        insert(TodoDB)
+        .values(user_id=USER_ID, title=f"Todo {i}", created_at=datetime.now())
+        .returning(TodoDB)
+    )
+    await session.commit()
+    return todo.id
+
+
+async def returning_update(session, todo_id):
+    result = await session.execute(
+        update(TodoDB)
+        .where(TodoDB.id == todo_id, TodoDB.user_id == USER_ID)
+        .values(completed=True, updated_at=datetime.now())
+        .returning(TodoDB)
+        .execution_options(synchronize_session=False)
+    )
+    result.scalar_one()
+    await session.commit()
+
+
+async def returning_delete(session, todo_id):
+    result = await session.execute(
+        delete(TodoDB)
+        .where(TodoDB.id == todo_id, TodoDB.user_id == USER_ID)
+        .returning(TodoDB.id)
+    )
+    result.scalar_one()
+    await session.commit()
+
+
+VARIANTS = {
+    "orm": (orm_create, orm_update, orm_delete),
+    "returning": (returning_create, returning_update, returning_delete),
+}
+
+
+def summarize(samples) -> dict:
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 3),
+        "p99_ms": round(samples[int(len(samples) * 0.99) - 1] * 1000, 3),
+    }
+
+
+async def bench_variant(name: str, writes: int) -> dict:
+    create, modify, remove = VARIANTS[name]
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(url=f"sqlite+aiosqlite:///{directory}/bench.db")
+        await db.create_tables()
+        async with db.session() as session:
+            session.add(UserDB(id=USER_ID, email="bench@example.com"))
+            await session.commit()
+
+        timings = {"create": [], "update": [], "delete": []}
+        ids = []
+        for i in range(writes):
+            async with db.session() as session:
+                start = time.perf_counter()
+                ids.append(await create(session, i))
+                timings["create"].append(time.perf_counter() - start)
+        for step, operation in (("update", modify), ("delete", remove)):
+            for todo_id in ids:
+                async with db.session() as session:
+                    start = time.perf_counter()
+                    await operation(session, todo_id)
+                    timings[step].append(time.perf_counter() - start)
+        await db.dispose()
+
+    return {"variant": name, **{step: summarize(samples) for step, samples in timings.items()}}
+
+
+async def main_async(args) -> list:
+    return [await bench_variant(name, args.writes) for name in VARIANTS]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--writes", type=int, default=2000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Measure GET /todos/search query latency on a large table.
+
+Seeds todos for many users with titles and descriptions drawn from a
+Zipf-distributed vocabulary, so a few words are very common and most are
+rare, as in real text. The FTS index is filled by the triggers, like
+regular writes. It then times the search query of one user for common,
+rare, multi-word and prefix queries.
+
+Usage:
+    python benchmarks/bench_search.py [--rows 1000000] [--users 1000] [--repeat 50]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import string
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import insert  # noqa: E402
+
+from app import build_search_query  # noqa: E402
+from database import Database, TodoDB, UserDB  # noqa: E402
+
+VOCABULARY_SIZE = 20000
+SEED_CHUNK = 10000
+
+
+def make_vocabulary(rng: random.Random) -> list:
+    words = set()
+    while len(words) < VOCABULARY_SIZE:
+        words.add("".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 10))))
+    return sorted(words)
+
+
+async def seed(db: Database, rows: int, users: list, vocabulary: list, rng: random.Random) -> None:
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    now = datetime.now()
+    async with db.session() as session:
+        await session.execute(insert(UserDB), [{"id": user, "email": f"{user}@example.com"} for user in users])
+        for start in range(0, rows, SEED_CHUNK):
+            count = min(SEED_CHUNK, rows - start)
+            words = rng.choices(vocabulary, weights, k=count * 12)
+            await session.execute(insert(TodoDB.__table__), [
+                {
+                    "user_id": rng.choice(users),
+                    "title": " ".join(words[i * 12:i * 12 + 4]),
+                    "description": " ".join(words[i * 12 + 4:i * 12 + 12]),
+                    "created_at": now,
+                    "updated_at": now,
+                    "version": 0,
+                }
+                for i in range(count)
+            ])
+        await session.commit()
+
+
+async def time_query(db: Database, user_id: str, q: str, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        async with db.read_session() as session:
+            rows = (await session.execute(build_search_query(user_id, q, 100))).all()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        "q": q,
+        "results": len(rows),
+        "p50_ms": round(statistics.median(samples) * 1000, 2),
+        "p99_ms": round(samples[int(len(samples) * 0.99) - 1] * 1000, 2),
+    }
+
+
+async def main_async(args) -> dict:
+    rng = random.Random(42)
+    vocabulary = make_vocabulary(rng)
+    users = [f"bench-user-{i}" for i in range(args.users)]
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(url=f"sqlite+aiosqlite:///{directory}/bench.db")
+        await db.create_tables()
+        start = time.perf_counter()
+        await seed(db, args.rows, users, vocabulary, rng)
+        seed_seconds = time.perf_counter() - start
+
+        common, rare = vocabulary[0], vocabulary[len(vocabulary) // 2]
+        queries = [common, rare, f"{common} {vocabulary[1]}", common[:2], rare[:3]]
+        results = [await time_query(db, users[0], q, args.repeat) for q in queries]
+        await db.dispose()
+    return {"rows": args.rows, "users": args.users, "seed_seconds": round(seed_seconds, 1), "queries": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Compare SQLite write and read throughput across DB_PRAGMA_PROFILE settings.
+
+For each profile a fresh database file is created and a set of concurrent
+tasks creates single todos the way POST /todos does (a version bump and an
+INSERT ... RETURNING submitted to db.write, so the writer task group-commits
+them under BEGIN IMMEDIATE), then reads pages of the newest todos through
+the read pool the way GET /todos does.
+
+Usage:
+    python benchmarks/bench_sqlite_profiles.py [--profiles safe,balanced,fast] [--writes 2000] [--reads 2000] [--concurrency 16]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import insert  # noqa: E402
+
+from app import build_list_query  # noqa: E402
+from database import Database, PRAGMA_PROFILES, TodoDB, UserDB, bump_todo_version  # noqa: E402
+
+USER_ID = "bench-user"
+
+
+async def run_tasks(total: int, concurrency: int, operation) -> float:
+    """Run `total` operations on `concurrency` tasks and return operations per second"""
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            await operation(i)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return total / (time.perf_counter() - start)
+
+
+async def bench_profile(profile: str, writes: int, reads: int, concurrency: int) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(
+            url=f"sqlite+aiosqlite:///{directory}/bench.db",
+            pragma_profile=profile,
+            pool_size=concurrency,
+            max_overflow=0,
+        )
+        await db.create_tables()
+
+        async def add_user(session):
+            session.add(UserDB(id=USER_ID, email="bench@example.com"))
+
+        await db.write(add_user)
+
+        async def write(i):
+            async def operation(session):
+                now = datetime.now()
+                version = await bump_todo_version(session, USER_ID)
+                return await session.scalar(
+                    insert(TodoDB)
+                    .values(user_id=USER_ID, title=f"Todo {i}", created_at=now, updated_at=now, version=version)
+                    .returning(TodoDB)
+                )
+
+            await db.write(operation)
+
+        async def read(i):
+            async with db.read_session() as session:
+                (await session.execute(build_list_query(USER_ID, "all", 100))).all()
+
+        write_rate = await run_tasks(writes, concurrency, write)
+        read_rate = await run_tasks(reads, concurrency, read)
+        settings = await db.effective_settings()
+        batches = db.writer.batches
+        await db.dispose()
+
+    return {
+        "profile": profile,
+        "settings": settings,
+        "writes_per_sec": round(write_rate, 1),
+        # The first batch is the bench user
+        "writes_per_commit": round(writes / max(batches - 1, 1), 1),
+        "reads_per_sec": round(read_rate, 1),
+    }
+
+
+async def main_async(args) -> list:
+    results = []
+    for profile in args.profiles.split(","):
+        results.append(await bench_profile(profile, args.writes, args.reads, args.concurrency))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--profiles", default=",".join(PRAGMA_PROFILES))
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--reads", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
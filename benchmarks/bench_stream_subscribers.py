@@ -0,0 +1,76 @@
+"""
+Measure how many idle /todos/stream subscribers one worker can hold.
+
+Each subscriber runs the real event_stream generator in its own task, as
+StreamingResponse would. The script reports memory per idle subscriber and
+how long one publish takes to reach every subscriber.
+
+Usage:
+    python benchmarks/bench_stream_subscribers.py [--subscribers 10000] [--users 1000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from events import TodoEventBroker, event_stream  # noqa: E402
+
+
+async def consume(stream, received: asyncio.Queue):
+    async for chunk in stream:
+        if chunk.startswith("event:"):
+            received.put_nowait(time.perf_counter())
+
+
+async def run(subscribers: int, users: int) -> dict:
+    broker = TodoEventBroker()
+    received: asyncio.Queue = asyncio.Queue()
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    tasks = [
+        asyncio.create_task(consume(event_stream(broker, f"user-{i % users}", heartbeat_interval=3600), received))
+        for i in range(subscribers)
+    ]
+    await asyncio.sleep(0.1)  # let every task subscribe and go idle
+    held = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    # Fan one event out to every subscriber of every user
+    event = {"type": "deleted", "version": 1, "id": 1}
+    start = time.perf_counter()
+    for user in range(users):
+        broker.publish(f"user-{user}", event)
+    publish_done = time.perf_counter()
+    last = start
+    for _ in range(subscribers):
+        last = max(last, await received.get())
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    return {
+        "subscribers": subscribers,
+        "users": users,
+        "bytes_per_idle_subscriber": round(held / subscribers),
+        "publish_ms": round((publish_done - start) * 1000, 3),
+        "fanout_ms": round((last - start) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--subscribers", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.subscribers, args.users)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""
+Load-test the API in-process and report latency percentiles and throughput.
+
+For every data size, a fresh SQLite database is seeded with that many todos
+for one user. The app is then driven through httpx's ASGI transport, with
+get_current_user overridden, by concurrent clients that pick requests from
+a weighted mix of every endpoint: list views with cursors, single reads,
+search, stats, change feed, export, creates, updates, deletes, batch
+operations, import and health. /todos/stream is long-lived and is covered
+by bench_stream_subscribers.py instead.
+
+Each size runs in its own subprocess, so module-level state (engine, caches,
+writer) starts clean. A given --seed always seeds the same data and gives
+every client its own random stream derived from it. With --concurrency 1 the
+whole run is reproducible; with more clients, which client sends each request
+depends on scheduling, so only the request mix is repeated, not the exact
+sequence. The JSON output records the git commit, so results can be compared
+between commits.
+
+Usage:
+    python benchmarks/loadtest.py [--sizes 1,1000,100000] [--requests 5000] [--concurrency 32] [--seed 1] [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+USER_ID = "loadtest-user"
+SEED_CHUNK = 5000
+WORDS = [
+    "report", "meeting", "groceries", "invoice", "budget", "review", "deploy", "design",
+    "travel", "call", "email", "draft", "plan", "fix", "office", "schedule", "client", "backup",
+]
+
+
+def percentile(samples, fraction: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def summarize(samples, elapsed: float) -> dict:
+    samples = sorted(samples)
+    return {
+        "count": len(samples),
+        "rps": round(len(samples) / elapsed, 1),
+        "p50_ms": round(statistics.median(samples) * 1000, 3),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+    }
+
+
+def phrase(rng: random.Random, count: int) -> str:
+    return " ".join(rng.choices(WORDS, k=count))
+
+
+class Workload:
+    """
+    One client's weighted request mix. The live todo ids are shared between
+    clients so writes hit real rows.
+    """
+
+    def __init__(self, client, rng: random.Random, ids: list):
+        self.client = client
+        self.rng = rng
+        self.ids = ids
+        self.sync_token = 0
+        self.cursors = {}
+        self.mix = [
+            ("GET /todos", 20, self.list_all),
+            ("GET /todos?cursor", 6, self.list_next_page),
+            ("GET /todos/active", 6, lambda: self.client.get("/todos/active")),
+            ("GET /todos/completed", 6, lambda: self.client.get("/todos/completed")),
+            ("GET /todos/{id}", 14, self.get_one),
+            ("GET /todos/search", 6, self.search),
+            ("GET /todos/stats", 6, lambda: self.client.get("/todos/stats")),
+            ("GET /todos/changes", 4, self.changes),
+            ("GET /todos/export", 1, self.export),
+            ("POST /todos", 10, self.create),
+            ("PUT /todos/{id}", 8, self.update),
+            ("DELETE /todos/{id}", 3, self.delete),
+            ("POST /todos/batch", 2, self.batch_create),
+            ("PATCH /todos/batch", 2, self.batch_update),
+            ("DELETE /todos/batch", 1, self.batch_delete),
+            ("POST /todos/import", 1, self.import_ndjson),
+            ("GET /health", 4, lambda: self.client.get("/health")),
+        ]
+        self.weights = [weight for _, weight, _ in self.mix]
+
+    def pick(self):
+        return self.rng.choices(self.mix, self.weights)[0]
+
+    def some_id(self) -> int:
+        return self.rng.choice(self.ids) if self.ids else 1
+
+    async def list_all(self):
+        response = await self.client.get("/todos")
+        if "x-next-cursor" in response.headers:
+            self.cursors["all"] = response.headers["x-next-cursor"]
+        return response
+
+    async def list_next_page(self):
+        cursor = self.cursors.get("all")
+        return await self.client.get("/todos", params={"cursor": cursor} if cursor else None)
+
+    async def get_one(self):
+        return await self.client.get(f"/todos/{self.some_id()}")
+
+    async def search(self):
+        word = self.rng.choice(WORDS)
+        return await self.client.get("/todos/search", params={"q": word[:self.rng.randint(3, len(word))]})
+
+    async def changes(self):
+        response = await self.client.get("/todos/changes", params={"since": self.sync_token})
+        if response.status_code == 200:
+            self.sync_token = response.json()["sync_token"]
+        return response
+
+    async def export(self):
+        async with self.client.stream("GET", "/todos/export") as response:
+            async for _ in response.aiter_raw():
+                pass
+        return response
+
+    async def create(self):
+        response = await self.client.post("/todos", json={"title": phrase(self.rng, 3), "description": phrase(self.rng, 8)})
+        if response.status_code == 201:
+            self.ids.append(response.json()["id"])
+        return response
+
+    async def update(self):
+        return await self.client.put(
+            f"/todos/{self.some_id()}", json={"completed": self.rng.random() < 0.5, "title": phrase(self.rng, 3)}
+        )
+
+    def take_ids(self, count: int) -> list:
+        taken = []
+        for _ in range(min(count, len(self.ids))):
+            index = self.rng.randrange(len(self.ids))
+            self.ids[index], self.ids[-1] = self.ids[-1], self.ids[index]
+            taken.append(self.ids.pop())
+        return taken
+
+    async def delete(self):
+        taken = self.take_ids(1)
+        return await self.client.delete(f"/todos/{taken[0] if taken else 1}")
+
+    async def batch_create(self):
+        response = await self.client.post("/todos/batch", json={"items": [
+            {"title": phrase(self.rng, 3)} for _ in range(20)
+        ]})
+        if response.status_code == 201:
+            self.ids.extend(result["id"] for result in response.json()["results"])
+        return response
+
+    async def batch_update(self):
+        ids = {self.some_id() for _ in range(20)}
+        return await self.client.patch("/todos/batch", json={"items": [
+            {"id": todo_id, "completed": self.rng.random() < 0.5} for todo_id in ids
+        ]})
+
+    async def batch_delete(self):
+        return await self.client.request("DELETE", "/todos/batch", json={"ids": self.take_ids(10) or [1]})
+
+    async def import_ndjson(self):
+        body = "\n".join(json.dumps({"title": phrase(self.rng, 3)}) for _ in range(50))
+        return await self.client.post("/todos/import", content=body, headers={"Content-Type": "application/x-ndjson"})
+
+
+async def seed(db, size: int, rng: random.Random) -> list:
+    from sqlalchemy import insert, select
+    from database import TodoDB, UserDB
+
+    start = datetime.now() - timedelta(days=365)
+    async with db.session() as session:
+        session.add(UserDB(id=USER_ID, email="loadtest@example.com", name="Load Test"))
+        await session.flush()
+        for offset in range(0, size, SEED_CHUNK):
+            rows = []
+            for i in range(offset, min(size, offset + SEED_CHUNK)):
+                created = start + timedelta(seconds=i * 30)
+                rows.append({
+                    "user_id": USER_ID,
+                    "title": phrase(rng, 3),
+                    "description": phrase(rng, 8),
+                    "completed": rng.random() < 0.4,
+                    "created_at": created,
+                    "updated_at": created,
+                    "version": 0,
+                })
+            await session.execute(insert(TodoDB.__table__), rows)
+        await session.commit()
+        result = await session.execute(select(TodoDB.id).where(TodoDB.user_id == USER_ID))
+        return list(result.scalars().all())
+
+
+async def run_size(size: int, requests: int, warmup: int, concurrency: int, seed_value: int) -> dict:
+    from httpx import AsyncClient
+    from app import app
+    from auth import get_current_user
+    from database import db
+    from models import AuthUser
+
+    logging.getLogger().setLevel(logging.WARNING)
+    user = AuthUser(id=USER_ID, email="loadtest@example.com", name="Load Test")
+
+    async def override_get_current_user():
+        return user
+
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    await db.create_tables()
+    rng = random.Random(seed_value)
+    seed_start = time.perf_counter()
+    ids = await seed(db, size, rng)
+    seed_seconds = time.perf_counter() - seed_start
+
+    samples = {}
+    statuses = {}
+    errors = 0
+    async with AsyncClient(app=app, base_url="http://loadtest") as client:
+        workloads = [
+            Workload(client, random.Random(f"{seed_value}:{index}"), ids) for index in range(concurrency)
+        ]
+
+        async def drive(count: int, record: bool):
+            remaining = iter(range(count))
+
+            async def worker(workload: Workload):
+                nonlocal errors
+                for _ in remaining:
+                    name, _, request = workload.pick()
+                    started = time.perf_counter()
+                    try:
+                        response = await request()
+                        code = response.status_code
+                    except Exception:
+                        code = "exception"
+                    elapsed = time.perf_counter() - started
+                    if not record:
+                        continue
+                    samples.setdefault(name, []).append(elapsed)
+                    statuses.setdefault(name, {}).setdefault(str(code), 0)
+                    statuses[name][str(code)] += 1
+                    if code == "exception" or code >= 500:
+                        errors += 1
+
+            await asyncio.gather(*(worker(workload) for workload in workloads))
+
+        await drive(warmup, record=False)
+        started = time.perf_counter()
+        await drive(requests, record=True)
+        elapsed = time.perf_counter() - started
+
+    await db.dispose()
+    overall = summarize([value for values in samples.values() for value in values], elapsed)
+    return {
+        "size": size,
+        "seed_seconds": round(seed_seconds, 2),
+        "elapsed_seconds": round(elapsed, 3),
+        "errors": errors,
+        "overall": overall,
+        "endpoints": {
+            name: dict(summarize(values, elapsed), statuses=statuses[name])
+            for name, values in sorted(samples.items())
+        },
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_in_subprocess(size: int, args) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, DATABASE_URL=f"sqlite+aiosqlite:///{directory}/loadtest.db")
+        completed = subprocess.run(
+            [
+                sys.executable, os.path.abspath(__file__), "--run-size", str(size),
+                "--requests", str(args.requests), "--warmup", str(args.warmup),
+                "--concurrency", str(args.concurrency), "--seed", str(args.seed),
+            ],
+            env=env, capture_output=True, text=True,
+        )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Load test for size {size} failed:\n{completed.stderr}")
+    return json.loads(completed.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="1,1000,100000", help="todos seeded per run, comma separated")
+    parser.add_argument("--requests", type=int, default=5000, help="measured requests per size")
+    parser.add_argument("--warmup", type=int, default=500, help="unmeasured requests before measuring")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--run-size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_size is not None:
+        result = asyncio.run(run_size(args.run_size, args.requests, args.warmup, args.concurrency, args.seed))
+        print(json.dumps(result))
+        return
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "config": {
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+        },
+        "results": [run_in_subprocess(int(size), args) for size in args.sizes.split(",")],
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Hashable, Optional, Tuple
+
+from events import VersionFetcher
+
+logger = logging.getLogger(__name__)
+
+LIST_CACHE_MAX_BYTES = int(os.getenv("LIST_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+LIST_CACHE_TTL = float(os.getenv("LIST_CACHE_TTL", "10"))
+# Seconds between checks for writes made by other worker processes; 0 disables
+LIST_CACHE_POLL_INTERVAL = float(os.getenv("LIST_CACHE_POLL_INTERVAL", "1"))
+
+# Rough per-entry bookkeeping cost on top of the body, used for the memory cap
+ENTRY_OVERHEAD_BYTES = 512
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    headers: Dict[str, str]
+    expires_at: float
+    size: int
+
+
+class ListCache:
+    """
+    Bounded LRU cache of serialized todo list pages, keyed by user first.
+
+    Writes invalidate every page of the affected user. To keep a read that
+    started before a write from storing its now-stale page afterwards,
+    callers take a token with `begin_read` before querying and pass it to
+    `put`, which refuses the page if the user was invalidated in between.
+    Hits never touch the database. Writes in other worker processes do not
+    reach this cache, so pages are stored with the todo version they were
+    read at, and a background poll drops the pages of users whose version
+    has since moved ahead. Entries also expire after a TTL.
+    """
+    def __init__(self, max_bytes: int = LIST_CACHE_MAX_BYTES, ttl: float = LIST_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, Hashable], CachedResponse]" = OrderedDict()
+        self._user_keys: Dict[str, set] = {}
+        self._bytes = 0
+        # Invalidation clock: user -> clock value of their last invalidation.
+        # Marks beyond the cap are forgotten by raising the floor instead.
+        self._clock = 0
+        self._marks: "OrderedDict[str, int]" = OrderedDict()
+        self._max_marks = 100_000
+        self._floor = 0
+        # user_id -> oldest todo version among the user's cached pages
+        self._versions: Dict[str, int] = {}
+        self._poll_task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit ratio and size counters"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def get(self, user_id: str, key: Hashable) -> Optional[CachedResponse]:
+        if not self.enabled:
+            return None
+        entry = self._entries.get((user_id, key))
+        if entry is None:
+            self.misses += 1
+            return None
+        if time.monotonic() >= entry.expires_at:
+            self._remove((user_id, key))
+            self.misses += 1
+            return None
+        self._entries.move_to_end((user_id, key))
+        self.hits += 1
+        return entry
+
+    def begin_read(self, user_id: str) -> int:
+        """Return a token identifying the cache state a database read starts from"""
+        return self._clock
+
+    def put(
+        self, user_id: str, key: Hashable, body: bytes, headers: Dict[str, str], token: int,
+        version: Optional[int] = None,
+    ) -> bool:
+        """Store a page read at todo `version` unless the user was invalidated after `token` was taken"""
+        if not self.enabled or token < self._floor or self._marks.get(user_id, -1) > token:
+            return False
+        size = len(body) + ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return False
+        full_key = (user_id, key)
+        if full_key in self._entries:
+            self._remove(full_key)
+        self._entries[full_key] = CachedResponse(body, headers, time.monotonic() + self.ttl, size)
+        self._user_keys.setdefault(user_id, set()).add(key)
+        if version is not None:
+            self._versions[user_id] = min(self._versions.get(user_id, version), version)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+        return True
+
+    def invalidate_user(self, user_id: str) -> None:
+        """Drop every cached page of a user"""
+        self._clock += 1
+        self._marks[user_id] = self._clock
+        self._marks.move_to_end(user_id)
+        while len(self._marks) > self._max_marks:
+            _, mark = self._marks.popitem(last=False)
+            self._floor = max(self._floor, mark)
+        self._versions.pop(user_id, None)
+        for key in self._user_keys.pop(user_id, ()):
+            entry = self._entries.pop((user_id, key), None)
+            if entry is not None:
+                self._bytes -= entry.size
+        self.invalidations += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._user_keys.clear()
+        self._versions.clear()
+        self._bytes = 0
+        self._clock += 1
+        self._floor = self._clock
+
+    def _remove(self, full_key: Tuple[str, Hashable]) -> None:
+        entry = self._entries.pop(full_key)
+        self._bytes -= entry.size
+        user_id, key = full_key
+        keys = self._user_keys.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[user_id]
+                self._versions.pop(user_id, None)
+
+    async def poll_once(self, fetch_versions: VersionFetcher) -> int:
+        """
+        Drop the pages of users whose todo version moved past the version
+        their pages were read at, and return how many users were dropped.
+        """
+        if not self._versions:
+            return 0
+        versions = await fetch_versions(list(self._versions))
+        stale = [
+            user_id for user_id, version in versions.items()
+            if user_id in self._versions and version > self._versions[user_id]
+        ]
+        for user_id in stale:
+            self.invalidate_user(user_id)
+        return len(stale)
+
+    async def _poll(self, fetch_versions: VersionFetcher, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.poll_once(fetch_versions)
+            except Exception as e:
+                logger.error(f"Failed to poll todo versions for the list cache: {e}")
+
+    def start_polling(self, fetch_versions: VersionFetcher, interval: float = LIST_CACHE_POLL_INTERVAL) -> None:
+        """Start the background poll for writes made by other processes"""
+        if interval > 0 and self.enabled and self._poll_task is None:
+            self._poll_task = asyncio.create_task(self._poll(fetch_versions, interval))
+
+    async def stop_polling(self) -> None:
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            try:
+                await self._poll_task
+            except asyncio.CancelledError:
+                pass
+            self._poll_task = None
+
+
+# Global list cache instance
+list_cache = ListCache()
@@ -0,0 +1,202 @@
+import asyncio
+import gzip
+import os
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# brotli and zstandard are optional; their encodings are offered only when installed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+# Bodies at least this large are compressed in a worker thread, off the event loop
+COMPRESSION_THREAD_MIN_SIZE = int(os.getenv("COMPRESSION_THREAD_MIN_SIZE", str(256 * 1024)))
+COMPRESSION_CACHE_MAX_BYTES = int(os.getenv("COMPRESSION_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml")
+
+
+def available_encodings() -> Dict[str, Callable[[bytes], bytes]]:
+    """Content codings this process can produce, most preferred first"""
+    encodings: Dict[str, Callable[[bytes], bytes]] = {}
+    if zstandard is not None:
+        encodings["zstd"] = zstandard.ZstdCompressor(level=COMPRESSION_ZSTD_LEVEL).compress
+    if brotli is not None:
+        encodings["br"] = lambda body: brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    encodings["gzip"] = lambda body: gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+    return encodings
+
+
+def negotiate_encoding(accept_encoding: str, offered: List[str]) -> Optional[str]:
+    """Pick the offered coding the client accepts with the highest q-value (RFC 9110).
+
+    Ties go to the server's order of preference; `identity` is never chosen
+    here, since the caller falls back to it.
+    """
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+    best, best_q = None, 0.0
+    for encoding in offered:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class CompressedBodyCache:
+    """
+    Bounded LRU cache of compressed bodies keyed by (ETag, coding).
+
+    A strong ETag identifies one exact body, so a cached compressed variant
+    can be served for any later response that carries the same ETag.
+    """
+    def __init__(self, max_bytes: int = COMPRESSION_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, etag: str, encoding: str) -> Optional[bytes]:
+        body = self._entries.get((etag, encoding))
+        if body is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end((etag, encoding))
+        self.hits += 1
+        return body
+
+    def put(self, etag: str, encoding: str, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        key = (etag, encoding)
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= len(previous)
+        self._entries[key] = body
+        self._bytes += len(body)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+
+class CompressionMiddleware:
+    """
+    Compress complete response bodies with the best coding the client accepts.
+
+    Only single-message bodies of a compressible type and at least
+    `min_size` bytes are compressed; streamed responses (change stream,
+    export) pass through untouched. Responses with a strong ETag get the
+    weak form of it, since the compressed bytes differ from the identity
+    representation, and their compressed body is cached by ETag.
+    """
+    def __init__(
+        self,
+        app: ASGIApp,
+        min_size: int = COMPRESSION_MIN_SIZE,
+        thread_min_size: int = COMPRESSION_THREAD_MIN_SIZE,
+        cache: Optional[CompressedBodyCache] = None,
+    ):
+        self.app = app
+        self.min_size = min_size
+        self.thread_min_size = thread_min_size
+        self.cache = cache if cache is not None else compressed_cache
+        self.encodings = available_encodings()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(
+            Headers(scope=scope).get("accept-encoding", ""), list(self.encodings)
+        )
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            # First body message: decide based on the whole response
+            headers = MutableHeaders(scope=start)
+            if self._compressible(headers) and not message.get("more_body", False):
+                headers.add_vary_header("Accept-Encoding")
+                body = message.get("body", b"")
+                if len(body) >= self.min_size:
+                    message = dict(message, body=await self._compress(body, encoding, headers))
+                    headers["Content-Encoding"] = encoding
+                    headers["Content-Length"] = str(len(message["body"]))
+                    etag = headers.get("etag")
+                    if etag and not etag.startswith("W/"):
+                        headers["ETag"] = "W/" + etag
+            passthrough = True
+            await send(start)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+    def _compressible(self, headers: MutableHeaders) -> bool:
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    async def _compress(self, body: bytes, encoding: str, headers: MutableHeaders) -> bytes:
+        # Only a strong ETag promises byte-identical bodies
+        etag = headers.get("etag")
+        if etag and etag.startswith("W/"):
+            etag = None
+        if etag:
+            cached = self.cache.get(etag, encoding)
+            if cached is not None:
+                return cached
+        compress = self.encodings[encoding]
+        if len(body) >= self.thread_min_size:
+            compressed = await asyncio.to_thread(compress, body)
+        else:
+            compressed = compress(body)
+        if etag:
+            self.cache.put(etag, encoding, compressed)
+        return compressed
+
+
+# Global compressed body cache
+compressed_cache = CompressedBodyCache()
@@ -1,11 +1,26 @@
 import os
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, text, ForeignKey
+import asyncio
+import contextvars
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Mapping, Optional, Tuple, TypeVar, Union
+from sqlalchemy import (
+    Column, Integer, String, Boolean, DateTime, ForeignKey, select, delete, update, func, event, table, column,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Row
+from sqlalchemy.engine import Connection, make_url
 from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
 from dotenv import load_dotenv
 
+from metrics import METRICS_ENABLED, db_pool_checkout_wait, db_statement_duration
+from timing import SERVER_TIMING_ENABLED, phase, record_phase
+from slow_queries import slow_query_log
+
 # Load environment variables
 load_dotenv()
 
@@ -13,6 +28,49 @@ logger = logging.getLogger(__name__)
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./todos.db")
 DB_ECHO = os.getenv("DB_ECHO", "false").lower() in ("true", "1", "t")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "10"))
+DB_READ_MAX_OVERFLOW = int(os.getenv("DB_READ_MAX_OVERFLOW", "20"))
+DB_PRAGMA_PROFILE = os.getenv("DB_PRAGMA_PROFILE", "balanced")
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "100"))
+WRITE_BATCH_WINDOW = float(os.getenv("WRITE_BATCH_WINDOW_MS", "0")) / 1000
+# Tombstones of deleted todos are kept this long; older sync tokens get 410 Gone
+TOMBSTONE_RETENTION_DAYS = float(os.getenv("TOMBSTONE_RETENTION_DAYS", "30"))
+TOMBSTONE_PRUNE_INTERVAL = float(os.getenv("TOMBSTONE_PRUNE_INTERVAL", "3600"))
+
+# SQLite connection profiles, applied to every new pooled connection.
+# Any single PRAGMA can be overridden with DB_PRAGMA_<NAME>, e.g. DB_PRAGMA_BUSY_TIMEOUT=10000.
+PRAGMA_PROFILES: Dict[str, Dict[str, Union[str, int]]] = {
+    # Durable on power loss: fsync on every commit
+    "safe": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+        "cache_size": -2000,
+        "temp_store": "DEFAULT",
+        "mmap_size": 0,
+    },
+    # WAL with NORMAL sync can lose the last commits on power loss, never corrupts
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -65536,
+        "temp_store": "MEMORY",
+        "mmap_size": 268435456,
+    },
+    # No fsync at all; for disposable data such as benchmarks and CI
+    "fast": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "busy_timeout": 5000,
+        "cache_size": -131072,
+        "temp_store": "MEMORY",
+        "mmap_size": 1073741824,
+    },
+}
 
 Base = declarative_base()
 
@@ -32,44 +90,728 @@ class UserDB(Base):
 class TodoDB(Base):
     __tablename__ = "todos"
     
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(String(100), ForeignKey("users.id"), index=True, nullable=False)
+    # Indexes are created by the schema migrations; see _migration_todo_list_indexes
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String(100), ForeignKey("users.id"), nullable=False)
     title = Column(String(200), nullable=False)
     description = Column(String(500), nullable=True)
     completed = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    # Todo version of the user at this todo's last write; drives the change feed
+    version = Column(Integer, nullable=False, default=0, server_default="0")
 
     user = relationship("UserDB", back_populates="todos")
 
 
-class Database:
-    def __init__(self):
-        self.engine = create_async_engine(
-            DATABASE_URL, 
-            echo=DB_ECHO, 
-            connect_args={"check_same_thread": False}
+class TodoTombstoneDB(Base):
+    __tablename__ = "todo_tombstones"
+    
+    # Records deleted todos so incremental sync clients learn about removals.
+    # Keyed by user too: SQLite can hand a deleted todo's id to another user's
+    # next todo, whose deletion must not overwrite this user's tombstone.
+    user_id = Column(String(100), ForeignKey("users.id"), primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=False)  # id of the deleted todo
+    version = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.now)
+
+
+class TodoVersionDB(Base):
+    __tablename__ = "todo_versions"
+    
+    # Incremented by every write to the user's todos; backs list ETags
+    user_id = Column(String(100), ForeignKey("users.id"), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    # Newest tombstone version pruned; sync tokens below it can miss deletions
+    pruned_version = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+class TodoStatsDB(Base):
+    __tablename__ = "todo_stats"
+    
+    # Per-user counters kept current by triggers on todos; see _migration_todo_stats
+    user_id = Column(String(100), ForeignKey("users.id"), primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+
+
+# FTS5 index over todos, created by a migration rather than the ORM metadata;
+# see _migration_todo_search
+todos_fts = table("todos_fts", column("rowid"), column("user_token"), column("title"), column("description"))
+
+# Users whose inserts are currently counted in bulk; always empty outside a
+# write. See _migration_todo_stats_bulk
+todo_stats_bulk = table("todo_stats_bulk", column("user_id"))
+
+
+def search_user_token(user_id: str) -> str:
+    """The todos_fts token of a user, matching hex(user_id) in SQLite"""
+    return user_id.encode("utf-8").hex().upper()
+
+
+async def bump_todo_version(session: AsyncSession, user_id: str) -> int:
+    """Increment a user's todo version inside the caller's transaction and return it"""
+    stmt = sqlite_insert(TodoVersionDB).values(user_id=user_id, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TodoVersionDB.user_id],
+        set_={"version": TodoVersionDB.version + 1},
+    ).returning(TodoVersionDB.version)
+    result = await session.execute(stmt)
+    return result.scalar_one()
+
+
+async def get_todo_version(session: AsyncSession, user_id: str) -> int:
+    """Return a user's current todo version (0 before their first write)"""
+    result = await session.execute(
+        select(TodoVersionDB.version).where(TodoVersionDB.user_id == user_id)
+    )
+    return result.scalar_one_or_none() or 0
+
+
+async def get_todo_sync_state(session: AsyncSession, user_id: str) -> Tuple[int, int]:
+    """Return a user's (version, pruned_version); sync tokens in between can be served"""
+    result = await session.execute(
+        select(TodoVersionDB.version, TodoVersionDB.pruned_version).where(TodoVersionDB.user_id == user_id)
+    )
+    row = result.one_or_none()
+    return (row.version, row.pruned_version) if row is not None else (0, 0)
+
+
+async def get_todo_versions(session: AsyncSession, user_ids: List[str]) -> Dict[str, int]:
+    """Return the current todo version of each given user that has written before"""
+    versions: Dict[str, int] = {}
+    # Stay well below SQLite's bound parameter limit
+    for start in range(0, len(user_ids), 500):
+        result = await session.execute(
+            select(TodoVersionDB.user_id, TodoVersionDB.version)
+            .where(TodoVersionDB.user_id.in_(user_ids[start:start + 500]))
+        )
+        versions.update(result.tuples().all())
+    return versions
+
+
+async def get_todo_stats(session: AsyncSession, user_id: str) -> Tuple[int, int]:
+    """Return a user's (total, completed) todo counts from the maintained counters"""
+    result = await session.execute(
+        select(TodoStatsDB.total, TodoStatsDB.completed).where(TodoStatsDB.user_id == user_id)
+    )
+    row = result.one_or_none()
+    return (row.total, row.completed) if row is not None else (0, 0)
+
+
+@asynccontextmanager
+async def bulk_todo_stats(session: AsyncSession, user_id: str, rows: List[Dict[str, Any]]) -> AsyncIterator[None]:
+    """
+    Count the todo rows a block inserts for a user with one todo_stats update.
+
+    The per-row todo_stats_insert trigger skips users listed in
+    todo_stats_bulk, so the block pays one upsert per chunk instead of one
+    per row. Use inside a write operation: if the block raises, rolling back
+    the operation's savepoint also removes the listing.
+    """
+    await session.execute(sqlite_insert(todo_stats_bulk).values(user_id=user_id))
+    yield
+    await session.execute(delete(todo_stats_bulk).where(todo_stats_bulk.c.user_id == user_id))
+    stmt = sqlite_insert(TodoStatsDB).values(
+        user_id=user_id,
+        total=len(rows),
+        completed=sum(1 for row in rows if row["completed"]),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TodoStatsDB.user_id],
+        set_={
+            "total": TodoStatsDB.total + stmt.excluded.total,
+            "completed": TodoStatsDB.completed + stmt.excluded.completed,
+        },
+    )
+    await session.execute(stmt)
+
+
+async def record_tombstones(session: AsyncSession, user_id: str, todo_ids: List[int], version: int) -> None:
+    """Record deleted todos at the given version inside the caller's transaction"""
+    if not todo_ids:
+        return
+    current_time = datetime.now()
+    stmt = sqlite_insert(TodoTombstoneDB).values([
+        {"id": todo_id, "user_id": user_id, "version": version, "deleted_at": current_time}
+        for todo_id in todo_ids
+    ])
+    # SQLite may reuse the id of a deleted todo for the same user, so a
+    # tombstone can be replaced
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TodoTombstoneDB.user_id, TodoTombstoneDB.id],
+        set_={
+            "version": stmt.excluded.version,
+            "deleted_at": stmt.excluded.deleted_at,
+        },
+    )
+    await session.execute(stmt)
+
+
+async def prune_tombstones(session: AsyncSession, deleted_before: datetime) -> int:
+    """
+    Delete tombstones recorded before a cutoff inside the caller's transaction
+    and return how many were removed.
+
+    Each affected user's pruned_version is raised to their newest pruned
+    tombstone, so the change feed can refuse sync tokens that would need
+    the deletions it no longer has.
+    """
+    expired = TodoTombstoneDB.deleted_at < deleted_before
+    newest_pruned = (
+        select(func.max(TodoTombstoneDB.version))
+        .where(TodoTombstoneDB.user_id == TodoVersionDB.user_id, expired)
+        .scalar_subquery()
+    )
+    await session.execute(
+        update(TodoVersionDB)
+        .where(TodoVersionDB.user_id.in_(select(TodoTombstoneDB.user_id).where(expired)))
+        .values(pruned_version=func.max(TodoVersionDB.pruned_version, newest_pruned))
+    )
+    result = await session.execute(delete(TodoTombstoneDB).where(expired))
+    return result.rowcount
+
+
+def tombstone_cutoff(retention_days: float = TOMBSTONE_RETENTION_DAYS) -> datetime:
+    """The deleted_at before which tombstones are pruned"""
+    return datetime.now() - timedelta(days=retention_days)
+
+
+def _migration_todo_list_indexes(conn: Connection) -> None:
+    """Composite indexes matching the todo list access paths.
+
+    Every index implicitly ends with the rowid (``todos.id``), so these also
+    serve the ``(sort column, id)`` keyset ordering without a temp B-tree.
+    """
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_todos_user_created "
+        "ON todos (user_id, created_at)"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_todos_user_completed_created "
+        "ON todos (user_id, completed, created_at)"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_todos_user_completed_updated "
+        "ON todos (user_id, completed, updated_at)"
+    )
+
+
+def _migration_todo_change_feed(conn: Connection) -> None:
+    """Per-todo write version and indexes for the incremental change feed"""
+    columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(todos)")}
+    if "version" not in columns:
+        conn.exec_driver_sql(
+            "ALTER TABLE todos ADD COLUMN version INTEGER NOT NULL DEFAULT 0"
+        )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_todos_user_version "
+        "ON todos (user_id, version)"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_todo_tombstones_user_version "
+        "ON todo_tombstones (user_id, version)"
+    )
+
+
+def _migration_todo_search(conn: Connection) -> None:
+    """FTS5 index over todo titles and descriptions, kept in sync by triggers"""
+    exists = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE name = 'todos_fts'"
+    ).scalar()
+    # The index reads its text from this view, which turns user_id into one
+    # hex token so a search is narrowed to one user's postings inside FTS.
+    conn.exec_driver_sql(
+        "CREATE VIEW IF NOT EXISTS todos_fts_source AS "
+        "SELECT id, hex(user_id) AS user_token, title, description FROM todos"
+    )
+    conn.exec_driver_sql(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS todos_fts USING fts5("
+        "user_token, title, description, "
+        "content='todos_fts_source', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS todos_fts_insert AFTER INSERT ON todos BEGIN "
+        "INSERT INTO todos_fts (rowid, user_token, title, description) "
+        "VALUES (new.id, hex(new.user_id), new.title, new.description); "
+        "END"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS todos_fts_delete AFTER DELETE ON todos BEGIN "
+        "INSERT INTO todos_fts (todos_fts, rowid, user_token, title, description) "
+        "VALUES ('delete', old.id, hex(old.user_id), old.title, old.description); "
+        "END"
+    )
+    # Only edits of indexed columns touch the index; completing a todo does not
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS todos_fts_update "
+        "AFTER UPDATE OF user_id, title, description ON todos BEGIN "
+        "INSERT INTO todos_fts (todos_fts, rowid, user_token, title, description) "
+        "VALUES ('delete', old.id, hex(old.user_id), old.title, old.description); "
+        "INSERT INTO todos_fts (rowid, user_token, title, description) "
+        "VALUES (new.id, hex(new.user_id), new.title, new.description); "
+        "END"
+    )
+    if not exists:
+        conn.exec_driver_sql("INSERT INTO todos_fts (todos_fts) VALUES ('rebuild')")
+
+
+def find_todo_stats_drift(conn: Connection) -> List[Dict[str, Any]]:
+    """Compare the stored per-user counters with a full count of todos"""
+    rows = conn.exec_driver_sql(
+        "SELECT user_id, sum(stored_total), sum(stored_completed), sum(total), sum(completed) FROM ("
+        "SELECT user_id, total AS stored_total, completed AS stored_completed, 0 AS total, 0 AS completed "
+        "FROM todo_stats "
+        "UNION ALL "
+        "SELECT user_id, 0, 0, count(*), coalesce(sum(completed), 0) FROM todos GROUP BY user_id"
+        ") GROUP BY user_id "
+        "HAVING sum(stored_total) != sum(total) OR sum(stored_completed) != sum(completed)"
+    )
+    return [
+        {
+            "user_id": user_id,
+            "stored": {"total": stored_total, "completed": stored_completed},
+            "actual": {"total": total, "completed": completed},
+        }
+        for user_id, stored_total, stored_completed, total, completed in rows
+    ]
+
+
+def rebuild_todo_stats(conn: Connection) -> None:
+    """Recompute every user's counters from the todos table"""
+    conn.exec_driver_sql(
+        "UPDATE todo_stats SET total = 0, completed = 0 "
+        "WHERE user_id NOT IN (SELECT user_id FROM todos)"
+    )
+    conn.exec_driver_sql(
+        "INSERT INTO todo_stats (user_id, total, completed) "
+        "SELECT user_id, count(*), coalesce(sum(completed), 0) FROM todos WHERE true GROUP BY user_id "
+        "ON CONFLICT (user_id) DO UPDATE SET total = excluded.total, completed = excluded.completed"
+    )
+
+
+def _migration_todo_stats(conn: Connection) -> None:
+    """Per-user todo counters maintained by triggers in the writing transaction"""
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS todo_stats ("
+        "user_id VARCHAR(100) NOT NULL PRIMARY KEY REFERENCES users (id), "
+        "total INTEGER NOT NULL DEFAULT 0, "
+        "completed INTEGER NOT NULL DEFAULT 0)"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS todo_stats_insert AFTER INSERT ON todos BEGIN "
+        "INSERT INTO todo_stats (user_id, total, completed) "
+        "VALUES (new.user_id, 1, coalesce(new.completed, 0)) "
+        "ON CONFLICT (user_id) DO UPDATE SET "
+        "total = total + 1, completed = completed + excluded.completed; "
+        "END"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS todo_stats_delete AFTER DELETE ON todos BEGIN "
+        "UPDATE todo_stats SET total = total - 1, completed = completed - coalesce(old.completed, 0) "
+        "WHERE user_id = old.user_id; "
+        "END"
+    )
+    # Fires only when completed or the owner actually changes
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS todo_stats_update AFTER UPDATE OF user_id, completed ON todos "
+        "WHEN old.user_id IS NOT new.user_id OR old.completed IS NOT new.completed BEGIN "
+        "UPDATE todo_stats SET total = total - 1, completed = completed - coalesce(old.completed, 0) "
+        "WHERE user_id = old.user_id; "
+        "INSERT INTO todo_stats (user_id, total, completed) "
+        "VALUES (new.user_id, 1, coalesce(new.completed, 0)) "
+        "ON CONFLICT (user_id) DO UPDATE SET "
+        "total = total + 1, completed = completed + excluded.completed; "
+        "END"
+    )
+    rebuild_todo_stats(conn)
+
+
+def _migration_tombstone_user_key(conn: Connection) -> None:
+    """Key todo tombstones by (user_id, id) instead of the reusable todo id alone"""
+    pk = [row[1] for row in sorted(
+        (row for row in conn.exec_driver_sql("PRAGMA table_info(todo_tombstones)") if row[5]),
+        key=lambda row: row[5],
+    )]
+    if pk == ["user_id", "id"]:
+        return
+    # SQLite cannot change a primary key in place: rebuild the table
+    conn.exec_driver_sql(
+        "CREATE TABLE todo_tombstones_new ("
+        "user_id VARCHAR(100) NOT NULL REFERENCES users (id), "
+        "id INTEGER NOT NULL, "
+        "version INTEGER NOT NULL, "
+        "deleted_at DATETIME, "
+        "PRIMARY KEY (user_id, id))"
+    )
+    existing = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(todo_tombstones)")}
+    copied = ", ".join(name for name in ("user_id", "id", "version", "deleted_at") if name in existing)
+    conn.exec_driver_sql(
+        f"INSERT INTO todo_tombstones_new ({copied}) SELECT {copied} FROM todo_tombstones"
+    )
+    conn.exec_driver_sql("DROP TABLE todo_tombstones")
+    conn.exec_driver_sql("ALTER TABLE todo_tombstones_new RENAME TO todo_tombstones")
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_todo_tombstones_user_version "
+        "ON todo_tombstones (user_id, version)"
+    )
+
+
+def _migration_todo_stats_bulk(conn: Connection) -> None:
+    """Let bulk inserts count their rows once per chunk; see bulk_todo_stats"""
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS todo_stats_bulk (user_id VARCHAR(100) NOT NULL PRIMARY KEY)"
+    )
+    conn.exec_driver_sql("DROP TRIGGER IF EXISTS todo_stats_insert")
+    conn.exec_driver_sql(
+        "CREATE TRIGGER todo_stats_insert AFTER INSERT ON todos "
+        "WHEN NOT EXISTS (SELECT 1 FROM todo_stats_bulk WHERE user_id = new.user_id) BEGIN "
+        "INSERT INTO todo_stats (user_id, total, completed) "
+        "VALUES (new.user_id, 1, coalesce(new.completed, 0)) "
+        "ON CONFLICT (user_id) DO UPDATE SET "
+        "total = total + 1, completed = completed + excluded.completed; "
+        "END"
+    )
+
+
+def _migration_tombstone_retention(conn: Connection) -> None:
+    """Remember how far each user's tombstones have been pruned"""
+    columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(todo_versions)")}
+    # A missing table is created by create_all with the column already in place
+    if columns and "pruned_version" not in columns:
+        conn.exec_driver_sql(
+            "ALTER TABLE todo_versions ADD COLUMN pruned_version INTEGER NOT NULL DEFAULT 0"
+        )
+
+
+def _migration_drop_redundant_todo_indexes(conn: Connection) -> None:
+    """Drop todo indexes no query needs; each one only slows down writes.
+
+    ix_todos_id duplicates the rowid primary key, ix_todos_user_id is a prefix
+    of every composite index, and no query orders by (user_id, updated_at).
+    The tombstone index gains ``id``, which is not that table's rowid, so the
+    change feed's (version, id) order needs no temp B-tree.
+    """
+    for name in ("ix_todos_id", "ix_todos_user_id", "ix_todos_user_updated", "ix_todo_tombstones_user_version"):
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+    conn.exec_driver_sql(
+        "CREATE INDEX ix_todo_tombstones_user_version "
+        "ON todo_tombstones (user_id, version, id)"
+    )
+
+
+# Versioned schema migrations, tracked with PRAGMA user_version. Steps run in
+# order after the base tables exist and must be idempotent, since several
+# workers may start against the same database at once.
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "todo list composite indexes", _migration_todo_list_indexes),
+    (2, "todo change feed versions", _migration_todo_change_feed),
+    (3, "todo full-text search", _migration_todo_search),
+    (4, "todo stats counters", _migration_todo_stats),
+    (5, "tombstones keyed by user", _migration_tombstone_user_key),
+    (6, "bulk todo stats", _migration_todo_stats_bulk),
+    (7, "tombstone retention", _migration_tombstone_retention),
+    (8, "drop redundant todo indexes", _migration_drop_redundant_todo_indexes),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def run_migrations(conn: Connection) -> int:
+    """Apply pending migrations and return the resulting schema version"""
+    current = conn.exec_driver_sql("PRAGMA user_version").scalar()
+    for version, description, step in MIGRATIONS:
+        if version <= current:
+            continue
+        step(conn)
+        conn.exec_driver_sql(f"PRAGMA user_version = {version}")
+        current = version
+        logger.info(f"Applied schema migration {version}: {description}")
+    return current
+
+
+def pragma_settings(profile: str, environ: Mapping[str, str] = os.environ) -> Dict[str, Union[str, int]]:
+    """Resolve a PRAGMA profile plus DB_PRAGMA_<NAME> overrides from the environment"""
+    if profile not in PRAGMA_PROFILES:
+        raise ValueError(
+            f"Unknown DB_PRAGMA_PROFILE {profile!r}; expected one of {', '.join(PRAGMA_PROFILES)}"
         )
+    settings = dict(PRAGMA_PROFILES[profile])
+    for name in settings:
+        override = environ.get(f"DB_PRAGMA_{name.upper()}")
+        if override is not None:
+            settings[name] = int(override) if override.lstrip("-").isdigit() else override
+    return settings
+
+
+T = TypeVar("T")
+WriteOperation = Callable[[AsyncSession], Awaitable[Any]]
+
+
+class WriteQueue:
+    """
+    Single writer task with group commit.
+
+    Request handlers submit write operations and await their results. The
+    writer drains whatever is queued (up to WRITE_BATCH_SIZE), runs each
+    operation in its own SAVEPOINT inside one BEGIN IMMEDIATE transaction and
+    commits once, so concurrent writes share a single lock acquisition and
+    fsync. An operation that raises only rolls back its own savepoint; its
+    exception is re-raised to the submitter.
+    """
+    def __init__(self, database: "Database", max_batch: int = WRITE_BATCH_SIZE, window: float = WRITE_BATCH_WINDOW):
+        self.database = database
+        self.max_batch = max(max_batch, 1)
+        self.window = window
+        self._queue: Optional["asyncio.Queue[Tuple[WriteOperation, asyncio.Future]]"] = None
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.operations = 0
+
+    def _ensure_started(self) -> "asyncio.Queue[Tuple[WriteOperation, asyncio.Future]]":
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            # Start from an empty context rather than that of the request
+            # that happened to submit first
+            self._task = loop.create_task(self._run(), context=contextvars.Context())
+        return self._queue
+
+    async def submit(self, operation: Callable[[AsyncSession], Awaitable[T]]) -> T:
+        """Queue a write operation and wait until its transaction has committed"""
+        queue = self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        queue.put_nowait((operation, future))
+        return await future
+
+    async def _run(self) -> None:
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            if self.window:
+                await asyncio.sleep(self.window)
+            while len(batch) < self.max_batch and not queue.empty():
+                batch.append(queue.get_nowait())
+            try:
+                await self._execute(batch)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def _execute(self, batch: List[Tuple[WriteOperation, asyncio.Future]]) -> None:
+        outcomes: List[Tuple[asyncio.Future, Any, Optional[BaseException]]] = []
+        try:
+            async with self.database.session() as session:
+                await session.connection(execution_options={"sqlite_begin": "BEGIN IMMEDIATE"})
+                for operation, future in batch:
+                    try:
+                        async with session.begin_nested():
+                            result = await operation(session)
+                        outcomes.append((future, result, None))
+                    except Exception as e:
+                        outcomes.append((future, None, e))
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Group commit of {len(batch)} writes failed: {e}")
+            # Nothing in the transaction was committed
+            outcomes = [(future, None, error or e) for future, _, error in outcomes]
+            outcomes += [(future, None, e) for _, future in batch[len(outcomes):]]
+        self.batches += 1
+        self.operations += len(batch)
+        for future, result, error in outcomes:
+            if future.done():  # the submitter went away
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    async def stop(self) -> None:
+        """Finish queued writes and stop the writer task"""
+        if self._task is None:
+            return
+        if self._task.get_loop() is asyncio.get_running_loop() and not self._task.done():
+            await self._queue.join()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._queue = None
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited for a connection"""
+    # SQLAlchemy names pool loggers after the class's module; keep them under
+    # sqlalchemy.pool, whose level it manages, instead of logging at INFO here
+    __module__ = AsyncAdaptedQueuePool.__module__
+    metrics_label = "primary"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_checkout_wait.observe(time.perf_counter() - start, self.metrics_label)
+
+
+class TimedReadQueuePool(TimedQueuePool):
+    # A subclass rather than an attribute, so pool.recreate() on dispose keeps it
+    __module__ = AsyncAdaptedQueuePool.__module__
+    metrics_label = "read"
+
+
+# Statement types get their own label; anything else is counted as OTHER
+STATEMENT_TYPES = frozenset(
+    ["SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE", "PRAGMA"]
+)
+
+
+def _statement_type(statement: str) -> str:
+    words = statement.split(None, 1)
+    keyword = words[0].upper() if words else ""
+    return keyword if keyword in STATEMENT_TYPES else "OTHER"
+
+
+def _instrument_statements(engine, label: str) -> None:
+    """
+    Time every cursor execution on `engine`: into the statement histogram,
+    labelled by statement type, into the request's `db` timing phase, and
+    against the slow query threshold
+    """
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_start = time.perf_counter()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_metrics_start", None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        if METRICS_ENABLED:
+            db_statement_duration.observe(elapsed, label, _statement_type(statement))
+        record_phase("db", elapsed)
+        if elapsed >= slow_query_log.threshold and slow_query_log.enabled:
+            slow_query_log.record(conn, statement, parameters, executemany, elapsed, label)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+class Database:
+    def __init__(
+        self,
+        url: str = DATABASE_URL,
+        pragma_profile: str = DB_PRAGMA_PROFILE,
+        pool_size: int = DB_POOL_SIZE,
+        max_overflow: int = DB_MAX_OVERFLOW,
+        read_pool_size: int = DB_READ_POOL_SIZE,
+        read_max_overflow: int = DB_READ_MAX_OVERFLOW,
+    ):
+        self.pragmas = pragma_settings(pragma_profile)
+        self.pragma_profile = pragma_profile
+        self.engine = self._create_engine(url, pool_size, max_overflow, query_only=False)
         self.async_session = async_sessionmaker(
             self.engine, class_=AsyncSession, expire_on_commit=False
         )
+        # GET endpoints read through their own query_only pool, so long scans
+        # never wait behind writers for a pooled connection. Every in-memory
+        # database is private to its connection, so those share the primary.
+        if make_url(url).database in (None, "", ":memory:"):
+            self.read_engine = self.engine
+        else:
+            self.read_engine = self._create_engine(url, read_pool_size, read_max_overflow, query_only=True)
+        self.async_read_session = async_sessionmaker(
+            self.read_engine, class_=AsyncSession, expire_on_commit=False
+        )
+        self.writer = WriteQueue(self)
+    
+    def _create_engine(self, url: str, pool_size: int, max_overflow: int, query_only: bool):
+        engine = create_async_engine(
+            url, 
+            echo=DB_ECHO, 
+            connect_args={"check_same_thread": False},
+            # aiosqlite defaults to NullPool, which reconnects (and re-applies
+            # the PRAGMA profile) for every session
+            poolclass=(TimedReadQueuePool if query_only else TimedQueuePool) if METRICS_ENABLED else AsyncAdaptedQueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+        pragmas = dict(self.pragmas, query_only="ON") if query_only else self.pragmas
+        event.listen(
+            engine.sync_engine, "connect",
+            lambda dbapi_connection, connection_record: self._apply_pragmas(dbapi_connection, pragmas)
+        )
+        event.listen(engine.sync_engine, "begin", self._begin)
+        if METRICS_ENABLED or SERVER_TIMING_ENABLED or slow_query_log.enabled:
+            _instrument_statements(engine.sync_engine, "read" if query_only else "primary")
+        return engine
+    
+    @staticmethod
+    def _apply_pragmas(dbapi_connection, pragmas: Mapping[str, Union[str, int]]) -> None:
+        """Apply a PRAGMA profile to a newly opened connection"""
+        # Take transaction control away from the driver, which otherwise
+        # defers BEGIN to the first DML statement and breaks SAVEPOINTs and
+        # transactional DDL; see _begin.
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+    
+    @staticmethod
+    def _begin(conn) -> None:
+        """Emit BEGIN ourselves; writers ask for BEGIN IMMEDIATE via execution options"""
+        conn.exec_driver_sql(conn.get_execution_options().get("sqlite_begin", "BEGIN"))
+    
+    async def write(self, operation: Callable[[AsyncSession], Awaitable[T]]) -> T:
+        """
+        Run a write operation through the single writer and return its result
+        once committed. The operation must not commit or roll back itself.
+        """
+        with phase("write"):
+            return await self.writer.submit(operation)
+    
+    async def effective_settings(self) -> Dict[str, Union[str, int]]:
+        """Read back the PRAGMA values and pool sizing a pooled connection actually uses"""
+        settings: Dict[str, Union[str, int]] = {"profile": self.pragma_profile}
+        async with self.engine.connect() as conn:
+            for name in self.pragmas:
+                settings[name] = (await conn.exec_driver_sql(f"PRAGMA {name}")).scalar()
+        settings["pool_size"] = self.engine.pool.size()
+        settings["max_overflow"] = self.engine.pool._max_overflow
+        settings["read_pool_size"] = self.read_engine.pool.size()
+        settings["read_max_overflow"] = self.read_engine.pool._max_overflow
+        return settings
     
     async def create_tables(self):
-        """Create database tables"""
+        """Create database tables and apply pending schema migrations"""
         try:
             async with self.engine.begin() as conn:
                 await conn.run_sync(Base.metadata.create_all)
-                await conn.execute(text("PRAGMA journal_mode=WAL"))
-            logger.info("Database tables created successfully")
+                version = await conn.run_sync(run_migrations)
+            logger.info(f"Database tables created successfully (schema version {version})")
+            settings = await self.effective_settings()
+            logger.info(
+                "SQLite settings: " + ", ".join(f"{name}={value}" for name, value in settings.items())
+            )
         except Exception as e:
             logger.error(f"Failed to create database tables: {e}")
             raise
     
     async def dispose(self):
-        """Dispose of the database engine"""
+        """Stop the writer and dispose of the database engines"""
         try:
+            await self.writer.stop()
             await self.engine.dispose()
-            logger.info("Database engine disposed successfully")
+            if self.read_engine is not self.engine:
+                await self.read_engine.dispose()
+            logger.info("Database engines disposed successfully")
         except Exception as e:
             logger.error(f"Failed to dispose database engine: {e}")
             raise
@@ -77,6 +819,31 @@ class Database:
     def session(self) -> AsyncSession:
         """Get async database session for use as async context manager"""
         return self.async_session()
+    
+    def read_session(self) -> AsyncSession:
+        """Get a session on the read-only pool for use as async context manager"""
+        return self.async_read_session()
+    
+    async def stream_todos(self, user_id: str, chunk_size: int = 500) -> AsyncIterator[List[Row]]:
+        """
+        Stream all todos of a user, newest first, in fixed-size chunks of plain rows.
+        
+        Rows are read through a server-side cursor, so memory use is bounded by
+        the chunk size rather than by the number of todos.
+        """
+        query = (
+            select(
+                TodoDB.id, TodoDB.title, TodoDB.description, TodoDB.completed,
+                TodoDB.created_at, TodoDB.updated_at
+            )
+            .where(TodoDB.user_id == user_id)
+            .order_by(TodoDB.created_at.desc(), TodoDB.id.desc())
+            .execution_options(yield_per=chunk_size)
+        )
+        async with self.read_session() as session:
+            result = await session.stream(query)
+            async for chunk in result.partitions(chunk_size):
+                yield chunk
 
 
 # Global database instance
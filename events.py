@@ -0,0 +1,182 @@
+import asyncio
+import json
+import os
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "100"))
+STREAM_HEARTBEAT_INTERVAL = float(os.getenv("STREAM_HEARTBEAT_INTERVAL", "15"))
+# Seconds between checks for writes made by other worker processes; 0 disables
+STREAM_POLL_INTERVAL = float(os.getenv("STREAM_POLL_INTERVAL", "1"))
+
+VersionFetcher = Callable[[List[str]], Awaitable[Dict[str, int]]]
+
+
+class Subscription:
+    """
+    One connected client's bounded event queue.
+
+    When the client falls behind and the queue fills up, the queued events
+    are replaced by a single `resync` event, so publishers never block on a
+    slow reader and the client knows to refetch instead of applying deltas.
+    """
+    def __init__(self, user_id: str, queue_size: int):
+        self.user_id = user_id
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=max(queue_size, 1))
+        self.dropped = 0
+
+    def offer(self, event: Dict[str, Any]) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += self.queue.qsize() + 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync"})
+
+
+class TodoEventBroker:
+    """
+    In-process publish/subscribe of todo changes, keyed by user.
+
+    Write endpoints publish after their transaction commits; each open
+    stream holds a Subscription for the authenticated user.
+
+    Writes handled by other worker processes are never published here.
+    To cover them, the broker remembers the latest todo version its
+    streams have seen per user. A background poll compares that with the
+    database and sends `resync` to users whose version moved ahead.
+    """
+    def __init__(self, queue_size: int = STREAM_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        # user_id -> latest todo version delivered to, or known by, their streams
+        self._versions: Dict[str, int] = {}
+        self._poll_task: Optional[asyncio.Task] = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(subscriptions) for subscriptions in self._subscribers.values())
+
+    def subscribe(self, user_id: str, version: Optional[int] = None) -> Subscription:
+        """Open a subscription; `version` is the user's todo version the stream starts from"""
+        subscription = Subscription(user_id, self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(subscription)
+        if version is not None:
+            self._versions[user_id] = max(self._versions.get(user_id, 0), version)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscribers.get(subscription.user_id)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscribers[subscription.user_id]
+            self._versions.pop(subscription.user_id, None)
+
+    def publish(self, user_id: str, event: Dict[str, Any]) -> None:
+        """Deliver an event to every open stream of a user without waiting"""
+        subscriptions = self._subscribers.get(user_id)
+        if not subscriptions:
+            return
+        version = event.get("version")
+        if version is not None and version > self._versions.get(user_id, 0):
+            self._versions[user_id] = version
+        for subscription in subscriptions:
+            subscription.offer(event)
+
+    async def poll_once(self, fetch_versions: VersionFetcher) -> int:
+        """
+        Send `resync` to subscribed users whose todo version is ahead of what
+        their streams have seen, and return how many users were resynced.
+        """
+        if not self._subscribers:
+            return 0
+        resynced = 0
+        versions = await fetch_versions(list(self._subscribers))
+        for user_id, version in versions.items():
+            if user_id not in self._subscribers:
+                continue
+            known = self._versions.get(user_id)
+            if known is None:
+                # Subscribed without a starting version: take this as the baseline
+                self._versions[user_id] = version
+            elif version > known:
+                self.publish(user_id, {"type": "resync", "version": version})
+                resynced += 1
+        return resynced
+
+    async def _poll(self, fetch_versions: VersionFetcher, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.poll_once(fetch_versions)
+            except Exception as e:
+                logger.error(f"Failed to poll todo versions for change streams: {e}")
+
+    def start_polling(self, fetch_versions: VersionFetcher, interval: float = STREAM_POLL_INTERVAL) -> None:
+        """Start the background poll for writes made by other processes"""
+        if interval > 0 and self._poll_task is None:
+            self._poll_task = asyncio.create_task(self._poll(fetch_versions, interval))
+
+    async def stop_polling(self) -> None:
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            try:
+                await self._poll_task
+            except asyncio.CancelledError:
+                pass
+            self._poll_task = None
+
+
+def format_sse(event: Dict[str, Any], with_id: bool = True) -> str:
+    """Render an event in text/event-stream framing, using the todo version as its id"""
+    lines = [f"event: {event['type']}"]
+    if with_id and event.get("version") is not None:
+        lines.append(f"id: {event['version']}")
+    lines.append(f"data: {json.dumps(event, default=str, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def event_stream(
+    broker: TodoEventBroker,
+    user_id: str,
+    heartbeat_interval: float = STREAM_HEARTBEAT_INTERVAL,
+    subscription: Optional[Subscription] = None,
+) -> AsyncIterator[str]:
+    """
+    Yield server-sent events for a user until the consumer stops iterating.
+
+    A comment line is sent every heartbeat interval so proxies keep the
+    connection open.
+
+    A write that touches several todos publishes one event per todo, all at
+    the same version and all at once. Only the last of them carries an
+    `id`, so a client resuming from its last id never skips the rest of
+    a write it saw only part of.
+    """
+    subscription = subscription or broker.subscribe(user_id)
+    try:
+        yield ": connected\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), heartbeat_interval)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            # Everything one write published is queued by now
+            pending = [event]
+            while not subscription.queue.empty():
+                pending.append(subscription.queue.get_nowait())
+            for event, following in zip(pending, pending[1:] + [None]):
+                last_of_version = following is None or following.get("version") != event.get("version")
+                yield format_sse(event, with_id=last_of_version)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+# Global broker instance
+broker = TodoEventBroker()
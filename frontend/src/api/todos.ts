@@ -1,9 +1,19 @@
 import api from '../lib/api';
 import type { Todo, TodoCreate, TodoUpdate } from '../types/todo';
 
+const NEXT_CURSOR_HEADER = 'x-next-cursor';
+
 export const fetchTodos = async (): Promise<Todo[]> => {
-  const { data } = await api.get<Todo[]>('/todos');
-  return data;
+  const todos: Todo[] = [];
+  let cursor: string | undefined;
+  do {
+    const response = await api.get<Todo[]>('/todos', {
+      params: cursor ? { cursor } : undefined,
+    });
+    todos.push(...response.data);
+    cursor = response.headers[NEXT_CURSOR_HEADER];
+  } while (cursor);
+  return todos;
 };
 
 export const createTodo = async (todo: TodoCreate): Promise<Todo> => {
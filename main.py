@@ -1,3 +1,4 @@
+import asyncio
 import uvicorn
 import os
 from dotenv import load_dotenv
@@ -6,8 +7,23 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from app import app
+from database import db
 
-if __name__ == "__main__":
+# Serve mode: "development" runs a single reloading uvicorn process,
+# "production" runs a gunicorn-managed pool of uvicorn workers
+SERVE_MODE = os.getenv("SERVE_MODE", "development").lower()
+
+# Production tuning
+WORKERS = int(os.getenv("WORKERS", "0")) or (os.cpu_count() or 1)
+KEEP_ALIVE = int(os.getenv("KEEP_ALIVE", "5"))
+BACKLOG = int(os.getenv("BACKLOG", "2048"))
+MAX_REQUESTS = int(os.getenv("MAX_REQUESTS", "10000"))
+MAX_REQUESTS_JITTER = int(os.getenv("MAX_REQUESTS_JITTER", "1000"))
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+WORKER_TIMEOUT = int(os.getenv("WORKER_TIMEOUT", "60"))
+
+
+def get_port() -> int:
     port_env = os.getenv("PORT", "8000")
     try:
         port = int(port_env)
@@ -15,10 +31,85 @@ if __name__ == "__main__":
             raise ValueError("Port must be between 1 and 65535")
     except ValueError as e:
         raise ValueError(f"Invalid PORT environment variable: {e}")
+    return port
+
+
+async def prepare_database() -> None:
+    """Create tables and apply migrations once, before any worker starts"""
+    await db.create_tables()
+    # Workers must not inherit open connections across fork
+    await db.dispose()
+
+
+if SERVE_MODE == "production":
+    # gunicorn only runs on Unix, so it is imported for production serving only
+    from uvicorn.workers import UvicornWorker
+
+    class ProductionUvicornWorker(UvicornWorker):
+        """Uvicorn worker pinned to uvloop and httptools.
+
+        Its own graceful timeout ends a few seconds before gunicorn's, so
+        long-lived streams are cancelled in time for the lifespan shutdown
+        to flush pending writes and dispose the engine.
+        """
+        CONFIG_KWARGS = {
+            "loop": "uvloop",
+            "http": "httptools",
+            "timeout_graceful_shutdown": max(GRACEFUL_TIMEOUT - 5, 1),
+        }
+
+
+def gunicorn_options(host: str, port: int) -> dict:
+    """Build the gunicorn settings for production serving"""
+    return {
+        "bind": f"{host}:{port}",
+        "workers": WORKERS,
+        "worker_class": "main.ProductionUvicornWorker",
+        "keepalive": KEEP_ALIVE,
+        "backlog": BACKLOG,
+        "max_requests": MAX_REQUESTS,
+        "max_requests_jitter": MAX_REQUESTS_JITTER,
+        "graceful_timeout": GRACEFUL_TIMEOUT,
+        "timeout": WORKER_TIMEOUT,
+        "accesslog": None,
+        "errorlog": "-",
+    }
+
+
+def run_production(host: str, port: int) -> None:
+    """Serve with one worker per CPU, recycled after MAX_REQUESTS requests.
+
+    SIGTERM makes gunicorn stop accepting connections and lets every worker
+    drain in-flight requests for up to GRACEFUL_TIMEOUT seconds.
+    """
+    from gunicorn.app.base import BaseApplication
+
+    class ProductionApplication(BaseApplication):
+        def __init__(self, options: dict):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    asyncio.run(prepare_database())
+    ProductionApplication(gunicorn_options(host, port)).run()
+
+
+if __name__ == "__main__":
+    port = get_port()
+    host = os.getenv("HOST", "0.0.0.0")
 
-    uvicorn.run(
-        "app:app",
-        host=os.getenv("HOST", "0.0.0.0"),
-        port=port,
-        reload=os.getenv("RELOAD", "true").lower() in ("true", "1", "t")
-    )
+    if SERVE_MODE == "production":
+        run_production(host, port)
+    else:
+        uvicorn.run(
+            "app:app",
+            host=host,
+            port=port,
+            reload=os.getenv("RELOAD", "true").lower() in ("true", "1", "t")
+        )
@@ -0,0 +1,60 @@
+"""
+Maintenance commands for the todo database.
+
+Usage:
+    python manage.py stats verify    # report users whose counters drifted; exit 1 if any
+    python manage.py stats rebuild   # recompute every user's counters from the todos table
+"""
+import argparse
+import asyncio
+import json
+import sys
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+from database import db, find_todo_stats_drift, rebuild_todo_stats
+
+
+async def verify_stats() -> int:
+    await db.create_tables()
+    try:
+        async with db.engine.connect() as conn:
+            drift = await conn.run_sync(find_todo_stats_drift)
+    finally:
+        await db.dispose()
+    for entry in drift:
+        print(json.dumps(entry))
+    print(f"{len(drift)} user(s) with drifted todo stats", file=sys.stderr)
+    return 1 if drift else 0
+
+
+async def rebuild_stats() -> int:
+    await db.create_tables()
+    try:
+        # Same lock as the writer, so no write lands between count and store
+        async with db.engine.connect() as conn:
+            conn = await conn.execution_options(sqlite_begin="BEGIN IMMEDIATE")
+            async with conn.begin():
+                await conn.run_sync(rebuild_todo_stats)
+    finally:
+        await db.dispose()
+    print("Todo stats rebuilt", file=sys.stderr)
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    stats = commands.add_parser("stats", help="per-user todo counters")
+    stats.add_argument("action", choices=["verify", "rebuild"])
+    args = parser.parse_args()
+
+    if args.action == "verify":
+        return asyncio.run(verify_stats())
+    return asyncio.run(rebuild_stats())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
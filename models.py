@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Any, List, Optional
 from pydantic import BaseModel, Field, field_validator
 from datetime import datetime
 
@@ -57,3 +57,77 @@ class Todo(TodoBase):
     updated_at: datetime = Field(..., description="Last update timestamp")
 
     model_config = {"from_attributes": True}
+
+
+# Maximum number of operations accepted by a single batch request
+MAX_BATCH_SIZE = 200
+
+
+class TodoBatchCreate(BaseModel):
+    """Model for creating several todos in one request"""
+    items: List[TodoCreate] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE, description="Todos to create")
+
+
+class TodoBatchUpdateItem(TodoUpdate):
+    """Model for one update within a batch request"""
+    id: int = Field(..., gt=0, description="Identifier of the todo to update")
+
+
+class TodoBatchUpdate(BaseModel):
+    """Model for updating several todos in one request"""
+    items: List[TodoBatchUpdateItem] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE, description="Updates to apply")
+
+
+class TodoBatchDelete(BaseModel):
+    """Model for deleting several todos in one request"""
+    ids: List[int] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE, description="Identifiers of the todos to delete")
+
+
+class TodoBatchResult(BaseModel):
+    """Outcome of a single operation within a batch request"""
+    id: Optional[int] = Field(None, description="Identifier of the affected todo")
+    status: int = Field(..., description="HTTP status code for this operation")
+    todo: Optional[Todo] = Field(None, description="Resulting todo, when created or updated")
+    detail: Optional[str] = Field(None, description="Error message, when the operation failed")
+
+
+class TodoBatchResponse(BaseModel):
+    """Model for batch responses, with results in request order"""
+    results: List[TodoBatchResult]
+
+
+class TodoImportError(BaseModel):
+    """A rejected record within an import"""
+    line: int = Field(..., description="Line number where the record starts")
+    detail: str = Field(..., description="Why the record was rejected")
+
+
+class TodoImportSummary(BaseModel):
+    """Model for the result of a bulk import"""
+    imported: int = Field(..., description="Number of todos created")
+    failed: int = Field(..., description="Number of records rejected")
+    errors: List[TodoImportError] = Field(default_factory=list, description="First rejected records, in file order")
+
+
+class TodoChanges(BaseModel):
+    """Model for the incremental change feed"""
+    changed: List[Todo] = Field(..., description="Todos created or updated since the sync token")
+    deleted: List[int] = Field(..., description="Ids of todos deleted since the sync token")
+    sync_token: int = Field(..., description="Token to pass as `since` on the next call")
+
+
+class TodoStats(BaseModel):
+    """Model for a user's todo counts"""
+    total: int = Field(..., description="Number of todos")
+    active: int = Field(..., description="Number of todos not yet completed")
+    completed: int = Field(..., description="Number of completed todos")
+
+
+class SlowQuery(BaseModel):
+    """A statement that ran longer than the slow query threshold"""
+    statement: str = Field(..., description="SQL as sent to SQLite")
+    parameters: Any = Field(..., description="Types of the bound parameters; values are never recorded")
+    duration_ms: float = Field(..., description="Execution time in milliseconds")
+    plan: List[str] = Field(..., description="EXPLAIN QUERY PLAN output, one node per line")
+    pool: str = Field(..., description="Connection pool the statement ran on")
+    recorded_at: datetime
@@ -0,0 +1,111 @@
+import logging
+import os
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Mapping
+
+from models import SlowQuery
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "100"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "100"))
+
+# Only these can be prefixed with EXPLAIN QUERY PLAN
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+
+
+def parameter_shape(parameters: Any, executemany: bool = False) -> Any:
+    """
+    Describe bound parameters by type only, so no user data reaches the log.
+
+    Runs of the same type are collapsed, e.g. a 500-id IN list becomes
+    ["int*500"].
+    """
+    if executemany:
+        rows = list(parameters)
+        return {"rows": len(rows), "each": parameter_shape(rows[0]) if rows else None}
+    if isinstance(parameters, Mapping):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        runs: List[List[Any]] = []
+        for value in parameters:
+            name = type(value).__name__
+            if runs and runs[-1][0] == name:
+                runs[-1][1] += 1
+            else:
+                runs.append([name, 1])
+        return [name if count == 1 else f"{name}*{count}" for name, count in runs]
+    return type(parameters).__name__
+
+
+def explain_query_plan(dbapi_connection, statement: str, parameters: Any) -> List[str]:
+    """Return the EXPLAIN QUERY PLAN rows for a statement, indented like the sqlite3 shell"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+        depth: Dict[int, int] = {0: -1}
+        plan = []
+        for node_id, parent, _, detail in cursor.fetchall():
+            depth[node_id] = depth.get(parent, -1) + 1
+            plan.append("  " * depth[node_id] + detail)
+        return plan
+    finally:
+        cursor.close()
+
+
+class SlowQueryLog:
+    """
+    Records statements that ran longer than a threshold.
+
+    Each slow statement is logged with its duration, the types of its bound
+    parameters and its query plan, and kept in a bounded ring buffer for
+    the admin endpoint. The plan is captured on the same connection right
+    after the statement ran, so it sees the same schema and transaction.
+    """
+    def __init__(self, threshold_ms: float = SLOW_QUERY_THRESHOLD_MS, size: int = SLOW_QUERY_LOG_SIZE):
+        self.threshold = threshold_ms / 1000
+        self.size = size
+        self._entries: Deque[SlowQuery] = deque(maxlen=max(size, 1))
+        self.recorded = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def record(self, conn, statement: str, parameters: Any, executemany: bool, seconds: float, pool: str) -> None:
+        """Record one slow statement; called from after_cursor_execute with the executing connection"""
+        plan: List[str] = []
+        if statement.lstrip()[:7].upper().startswith(EXPLAINABLE):
+            try:
+                plan = explain_query_plan(
+                    conn.connection.dbapi_connection, statement,
+                    parameters[0] if executemany and parameters else parameters,
+                )
+            except Exception as e:
+                plan = [f"EXPLAIN QUERY PLAN failed: {e}"]
+        entry = SlowQuery(
+            statement=statement,
+            parameters=parameter_shape(parameters, executemany),
+            duration_ms=round(seconds * 1000, 3),
+            plan=plan,
+            pool=pool,
+            recorded_at=datetime.now(),
+        )
+        self._entries.append(entry)
+        self.recorded += 1
+        logger.warning(
+            f"Slow query ({entry.duration_ms:.1f} ms, {pool} pool): {statement} "
+            f"parameters={entry.parameters} plan={plan}"
+        )
+
+    def entries(self) -> List[SlowQuery]:
+        """Recorded statements, newest first"""
+        return list(reversed(self._entries))
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+# Global slow query log
+slow_query_log = SlowQueryLog()
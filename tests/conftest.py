@@ -14,6 +14,8 @@ os.environ["OIDC_ISSUER"] = "https://test-issuer.com"
 os.environ["OIDC_AUDIENCE"] = "test-audience"
 
 from database import Base, db
+from cache import list_cache
+from compression import compressed_cache
 from app import app
 from auth import get_current_user
 from models import AuthUser
@@ -31,17 +33,21 @@ async def override_get_current_user():
 
 @pytest_asyncio.fixture(autouse=True)
 async def setup_test_db():
-    async with db.engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    await db.create_tables()
+    list_cache.clear()
+    compressed_cache.clear()
     
     yield
     
     async with db.engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
+    # Close pooled connections so the next test migrates a fresh file
+    await db.dispose()
     
-    # Clean up the test database file
-    if os.path.exists("./test_todos.db"):
-        os.remove("./test_todos.db")
+    # Clean up the test database files
+    for path in ("./test_todos.db", "./test_todos.db-wal", "./test_todos.db-shm"):
+        if os.path.exists(path):
+            os.remove(path)
 
 @pytest_asyncio.fixture(autouse=True)
 async def clear_db():
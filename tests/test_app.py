@@ -1,11 +1,32 @@
 import pytest
+from contextlib import contextmanager
 from fastapi import status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+
+from app import app
+from auth import get_current_user
+from database import db, TodoDB
+from models import AuthUser, Todo
 
 # Expected test user data (matches conftest.py)
 TEST_USER_ID = "test-user-id"
 TEST_USER_EMAIL = "test@example.com"
 TEST_USER_NAME = "Test User"
 
+OTHER_USER = AuthUser(id="other-user-id", email="other@example.com", name="Other User")
+
+@contextmanager
+def signed_in_as(user):
+    """Make the client's requests as `user` instead of the test user"""
+    previous = app.dependency_overrides[get_current_user]
+    app.dependency_overrides[get_current_user] = lambda: user
+    try:
+        yield
+    finally:
+        app.dependency_overrides[get_current_user] = previous
+
 @pytest.mark.asyncio
 async def test_root(client):
     response = await client.get("/")
@@ -168,3 +189,491 @@ async def test_create_todo_validation_error(client):
     # If we pass something that bypasses Pydantic but fails later...
     # But Pydantic is quite thorough.
     pass
+
+@pytest.mark.asyncio
+async def test_get_todos_pagination(client):
+    for i in range(5):
+        await client.post("/todos", json={"title": f"Todo {i}"})
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = await client.get("/todos", params=params)
+        assert response.status_code == status.HTTP_200_OK
+        page = response.json()
+        assert len(page) <= 2
+        seen.extend(todo["title"] for todo in page)
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert seen == [f"Todo {i}" for i in reversed(range(5))]
+
+@pytest.mark.asyncio
+async def test_pagination_stable_under_inserts(client):
+    for i in range(3):
+        await client.post("/todos", json={"title": f"Todo {i}"})
+
+    first = await client.get("/todos", params={"limit": 2})
+    cursor = first.headers["X-Next-Cursor"]
+    await client.post("/todos", json={"title": "Inserted later"})
+
+    second = await client.get("/todos", params={"limit": 2, "cursor": cursor})
+    assert [todo["title"] for todo in second.json()] == ["Todo 0"]
+    assert "X-Next-Cursor" not in second.headers
+
+@pytest.mark.asyncio
+async def test_completed_todos_pagination(client):
+    for i in range(3):
+        await client.post("/todos", json={"title": f"Done {i}", "completed": True})
+    await client.post("/todos", json={"title": "Not done"})
+
+    first = await client.get("/todos/completed", params={"limit": 2})
+    second = await client.get(
+        "/todos/completed", params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]}
+    )
+    titles = [todo["title"] for todo in first.json() + second.json()]
+    assert titles == ["Done 2", "Done 1", "Done 0"]
+
+@pytest.mark.asyncio
+async def test_pagination_invalid_cursor(client):
+    response = await client.get("/todos", params={"cursor": "not-a-cursor"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+@pytest.mark.asyncio
+async def test_pagination_cursor_bound_to_view(client):
+    for i in range(2):
+        await client.post("/todos", json={"title": f"Todo {i}"})
+    first = await client.get("/todos", params={"limit": 1})
+
+    response = await client.get(
+        "/todos/completed", params={"cursor": first.headers["X-Next-Cursor"]}
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+@pytest.mark.asyncio
+async def test_pagination_limit_bounds(client):
+    response = await client.get("/todos", params={"limit": 0})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+@pytest.mark.asyncio
+async def test_create_todos_batch(client):
+    items = [{"title": f"Batch {i}", "completed": i % 2 == 0} for i in range(3)]
+    response = await client.post("/todos/batch", json={"items": items})
+    assert response.status_code == status.HTTP_201_CREATED
+    results = response.json()["results"]
+    assert [r["status"] for r in results] == [201, 201, 201]
+    assert [r["todo"]["title"] for r in results] == ["Batch 0", "Batch 1", "Batch 2"]
+
+    listed = (await client.get("/todos")).json()
+    assert [todo["title"] for todo in listed] == ["Batch 2", "Batch 1", "Batch 0"]
+
+@pytest.mark.asyncio
+async def test_create_todos_batch_too_large(client):
+    items = [{"title": "Too many"}] * 201
+    response = await client.post("/todos/batch", json={"items": items})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+@pytest.mark.asyncio
+async def test_update_todos_batch(client):
+    first = (await client.post("/todos", json={"title": "First"})).json()
+    second = (await client.post("/todos", json={"title": "Second", "description": "Keep"})).json()
+
+    response = await client.patch("/todos/batch", json={"items": [
+        {"id": first["id"], "completed": True},
+        {"id": 9999, "title": "Missing"},
+        {"id": second["id"], "title": "Second renamed"},
+    ]})
+    assert response.status_code == status.HTTP_200_OK
+    results = response.json()["results"]
+    assert [r["status"] for r in results] == [200, 404, 200]
+    assert results[0]["todo"]["completed"] is True
+    assert results[0]["todo"]["title"] == "First"
+    assert results[2]["todo"]["title"] == "Second renamed"
+    assert results[2]["todo"]["description"] == "Keep"
+
+@pytest.mark.asyncio
+async def test_update_todos_batch_duplicate_ids(client):
+    todo = (await client.post("/todos", json={"title": "Once"})).json()
+    response = await client.patch("/todos/batch", json={"items": [
+        {"id": todo["id"], "completed": True},
+        {"id": todo["id"], "completed": False},
+    ]})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+@pytest.mark.asyncio
+async def test_delete_todos_batch(client):
+    first = (await client.post("/todos", json={"title": "First"})).json()
+    second = (await client.post("/todos", json={"title": "Second"})).json()
+
+    response = await client.request("DELETE", "/todos/batch", json={"ids": [first["id"], 9999, second["id"]]})
+    assert response.status_code == status.HTTP_200_OK
+    assert [r["status"] for r in response.json()["results"]] == [204, 404, 204]
+    assert (await client.get("/todos")).json() == []
+
+@pytest.mark.asyncio
+async def test_delete_todos_batch_duplicate_ids(client):
+    todo = (await client.post("/todos", json={"title": "Once"})).json()
+    response = await client.request("DELETE", "/todos/batch", json={"ids": [todo["id"], todo["id"]]})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert len((await client.get("/todos")).json()) == 1
+
+@pytest.mark.asyncio
+async def test_export_todos_ndjson(client, monkeypatch):
+    import json
+    import app as app_module
+    monkeypatch.setattr(app_module, "EXPORT_CHUNK_SIZE", 2)
+    for i in range(5):
+        await client.post("/todos", json={"title": f"Todo {i}", "completed": i == 0})
+
+    response = await client.get("/todos/export")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    assert exported == (await client.get("/todos")).json()
+
+@pytest.mark.asyncio
+async def test_export_todos_csv(client):
+    import csv
+    import io
+    await client.post("/todos", json={"title": "Comma, quoted", "description": "Line"})
+
+    response = await client.get("/todos/export", params={"format": "csv"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 1
+    assert rows[0]["title"] == "Comma, quoted"
+    assert rows[0]["completed"] == "false"
+
+@pytest.mark.asyncio
+async def test_export_todos_invalid_format(client):
+    response = await client.get("/todos/export", params={"format": "xml"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+@pytest.mark.asyncio
+async def test_import_todos_ndjson(client, monkeypatch):
+    import app as app_module
+    monkeypatch.setattr(app_module, "IMPORT_CHUNK_SIZE", 2)
+    body = "\n".join([
+        '{"title": "One"}',
+        '{"title": "Two", "completed": true}',
+        '',
+        'not json',
+        '{"title": ""}',
+        '{"title": "Three", "description": "Last"}',
+    ])
+
+    response = await client.post("/todos/import", content=body.encode())
+    assert response.status_code == status.HTTP_200_OK
+    summary = response.json()
+    assert summary["imported"] == 3
+    assert summary["failed"] == 2
+    assert [error["line"] for error in summary["errors"]] == [4, 5]
+
+    titles = [todo["title"] for todo in (await client.get("/todos")).json()]
+    assert sorted(titles) == ["One", "Three", "Two"]
+
+@pytest.mark.asyncio
+async def test_import_todos_streamed_body(client):
+    async def body():
+        yield b'{"title": "Spl'
+        yield b'it"}\n{"title": "Caf\xc3'
+        yield b'\xa9"}\n'
+
+    response = await client.post("/todos/import", content=body())
+    assert response.json() == {"imported": 2, "failed": 0, "errors": []}
+    titles = [todo["title"] for todo in (await client.get("/todos")).json()]
+    assert sorted(titles) == ["Café", "Split"]
+
+@pytest.mark.asyncio
+async def test_import_todos_reports_committed_rows_on_bad_body(client, monkeypatch):
+    import app as app_module
+    monkeypatch.setattr(app_module, "IMPORT_CHUNK_SIZE", 2)
+
+    async def body():
+        yield b'{"title": "One"}\n{"title": "Two"}\n{"title": "Three"}\n'
+        yield b'{"title": "' + b"x" * (app_module.IMPORT_MAX_LINE_LENGTH + 1)
+
+    response = await client.post("/todos/import", content=body())
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    assert response.json()["detail"].endswith("; 2 todos were imported before the error")
+    assert len((await client.get("/todos")).json()) == 2
+
+    response = await client.post("/todos/import", content=b'{"title": "Four"}\n\xff\n')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["detail"].endswith("; 0 todos were imported before the error")
+
+@pytest.mark.asyncio
+async def test_import_todos_csv_roundtrip(client):
+    await client.post("/todos", json={"title": "Multi", "description": "line one\nline two", "completed": True})
+    await client.post("/todos", json={"title": "Plain"})
+    exported = await client.get("/todos/export", params={"format": "csv"})
+
+    response = await client.post("/todos/import", params={"format": "csv"}, content=exported.content)
+    assert response.json() == {"imported": 2, "failed": 0, "errors": []}
+
+    todos = (await client.get("/todos")).json()
+    multi = [todo for todo in todos if todo["title"] == "Multi"]
+    assert len(multi) == 2
+    assert all(todo["description"] == "line one\nline two" and todo["completed"] for todo in multi)
+
+@pytest.mark.asyncio
+async def test_import_todos_csv_requires_title_column(client):
+    response = await client.post("/todos/import", params={"format": "csv"}, content=b"name\nfoo\n")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+@pytest.mark.asyncio
+async def test_list_etag_not_modified(client):
+    await client.post("/todos", json={"title": "Cached"})
+
+    first = await client.get("/todos")
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    second = await client.get("/todos", headers={"If-None-Match": etag})
+    assert second.status_code == status.HTTP_304_NOT_MODIFIED
+    assert second.headers["ETag"] == etag
+    assert second.content == b""
+
+@pytest.mark.asyncio
+async def test_list_etag_changes_on_every_write(client):
+    etags = [(await client.get("/todos/active")).headers["ETag"]]
+
+    todo = (await client.post("/todos", json={"title": "Versioned"})).json()
+    etags.append((await client.get("/todos/active")).headers["ETag"])
+    await client.put(f"/todos/{todo['id']}", json={"title": "Renamed"})
+    etags.append((await client.get("/todos/active")).headers["ETag"])
+    await client.patch("/todos/batch", json={"items": [{"id": todo["id"], "completed": True}]})
+    etags.append((await client.get("/todos/active")).headers["ETag"])
+    await client.delete(f"/todos/{todo['id']}")
+    etags.append((await client.get("/todos/active")).headers["ETag"])
+    assert len(set(etags)) == 5
+
+    response = await client.get("/todos/active", headers={"If-None-Match": etags[0]})
+    assert response.status_code == status.HTTP_200_OK
+
+@pytest.mark.asyncio
+async def test_list_etag_differs_per_view_and_page(client):
+    await client.post("/todos", json={"title": "One"})
+    etags = {
+        (await client.get("/todos")).headers["ETag"],
+        (await client.get("/todos/completed")).headers["ETag"],
+        (await client.get("/todos", params={"limit": 1})).headers["ETag"],
+    }
+    assert len(etags) == 3
+
+@pytest.mark.asyncio
+async def test_todo_changes_snapshot_and_delta(client):
+    kept = (await client.post("/todos", json={"title": "Kept"})).json()
+    removed = (await client.post("/todos", json={"title": "Removed"})).json()
+
+    snapshot = (await client.get("/todos/changes")).json()
+    assert {todo["id"] for todo in snapshot["changed"]} == {kept["id"], removed["id"]}
+    assert snapshot["deleted"] == []
+    token = snapshot["sync_token"]
+
+    empty = (await client.get("/todos/changes", params={"since": token})).json()
+    assert empty == {"changed": [], "deleted": [], "sync_token": token}
+
+    await client.put(f"/todos/{kept['id']}", json={"completed": True})
+    added = (await client.post("/todos", json={"title": "Added"})).json()
+    await client.delete(f"/todos/{removed['id']}")
+
+    delta = (await client.get("/todos/changes", params={"since": token})).json()
+    assert [todo["id"] for todo in delta["changed"]] == [kept["id"], added["id"]]
+    assert delta["changed"][0]["completed"] is True
+    assert delta["deleted"] == [removed["id"]]
+    assert delta["sync_token"] > token
+
+@pytest.mark.asyncio
+async def test_todo_changes_batch_delete_tombstones(client):
+    created = (await client.post("/todos/batch", json={"items": [{"title": "A"}, {"title": "B"}]})).json()
+    ids = [result["id"] for result in created["results"]]
+    token = (await client.get("/todos/changes")).json()["sync_token"]
+
+    await client.request("DELETE", "/todos/batch", json={"ids": ids})
+    delta = (await client.get("/todos/changes", params={"since": token})).json()
+    assert delta["changed"] == []
+    assert sorted(delta["deleted"]) == sorted(ids)
+
+@pytest.mark.asyncio
+async def test_todo_changes_tombstone_survives_id_reuse_by_other_user(client):
+    await client.post("/todos", json={"title": "Kept"})
+    removed = (await client.post("/todos", json={"title": "Removed"})).json()
+    token = (await client.get("/todos/changes")).json()["sync_token"]
+    await client.delete(f"/todos/{removed['id']}")
+
+    # SQLite hands the freed id to the other user's next todo
+    with signed_in_as(OTHER_USER):
+        reused = (await client.post("/todos", json={"title": "Other"})).json()
+        assert reused["id"] == removed["id"]
+        await client.delete(f"/todos/{reused['id']}")
+        other = (await client.get("/todos/changes", params={"since": 0})).json()
+        assert other["deleted"] == [reused["id"]]
+
+    delta = (await client.get("/todos/changes", params={"since": token})).json()
+    assert delta["deleted"] == [removed["id"]]
+
+@pytest.mark.asyncio
+async def test_todo_changes_token_ahead_of_server(client):
+    response = await client.get("/todos/changes", params={"since": 1000})
+    assert response.status_code == status.HTTP_410_GONE
+
+@pytest.mark.asyncio
+async def test_todo_changes_pages_by_version(client):
+    first, second, third = [
+        (await client.post("/todos", json={"title": title})).json() for title in ("First", "Second", "Third")
+    ]
+
+    page = await client.get("/todos/changes", params={"limit": 2})
+    assert [todo["id"] for todo in page.json()["changed"]] == [first["id"], second["id"]]
+    cursor = page.headers["X-Next-Cursor"]
+
+    # Writes between pages land after the cursor and are not lost
+    await client.put(f"/todos/{first['id']}", json={"completed": True})
+    await client.delete(f"/todos/{second['id']}")
+
+    page = await client.get("/todos/changes", params={"limit": 2, "cursor": cursor})
+    assert [todo["id"] for todo in page.json()["changed"]] == [third["id"], first["id"]]
+    assert page.json()["changed"][1]["completed"] is True
+    cursor = page.headers["X-Next-Cursor"]
+
+    page = await client.get("/todos/changes", params={"limit": 2, "cursor": cursor})
+    assert page.json()["changed"] == []
+    assert page.json()["deleted"] == [second["id"]]
+    assert "X-Next-Cursor" not in page.headers
+    token = page.json()["sync_token"]
+
+    empty = (await client.get("/todos/changes", params={"since": token})).json()
+    assert empty == {"changed": [], "deleted": [], "sync_token": token}
+
+@pytest.mark.asyncio
+async def test_todo_changes_rejects_tokens_older_than_pruned_tombstones(client):
+    from datetime import datetime, timedelta
+    from database import prune_tombstones
+
+    kept = (await client.post("/todos", json={"title": "Kept"})).json()
+    removed = (await client.post("/todos", json={"title": "Removed"})).json()
+    token = (await client.get("/todos/changes")).json()["sync_token"]
+    await client.delete(f"/todos/{removed['id']}")
+    current = (await client.get("/todos/changes", params={"since": token})).json()["sync_token"]
+
+    pruned = await db.write(lambda session: prune_tombstones(session, datetime.now() + timedelta(seconds=1)))
+    assert pruned == 1
+
+    response = await client.get("/todos/changes", params={"since": token})
+    assert response.status_code == status.HTTP_410_GONE
+    # Tokens from after the pruned deletion, and full snapshots, still work
+    assert (await client.get("/todos/changes", params={"since": current})).status_code == status.HTTP_200_OK
+    snapshot = (await client.get("/todos/changes")).json()
+    assert [todo["id"] for todo in snapshot["changed"]] == [kept["id"]]
+
+@pytest.mark.asyncio
+async def test_list_body_matches_model_serialization(client):
+    await client.post("/todos", json={"title": "Café \"quoted\" ✓", "description": "line\nbreak\t\u0001"})
+    await client.post("/todos", json={"title": "No description", "completed": True})
+    response = await client.get("/todos")
+
+    async with db.session() as session:
+        result = await session.execute(
+            select(TodoDB).order_by(TodoDB.created_at.desc(), TodoDB.id.desc())
+        )
+        todos = [Todo.model_validate(todo) for todo in result.scalars().all()]
+    assert response.content == JSONResponse(jsonable_encoder(todos)).body
+
+@pytest.mark.asyncio
+async def test_search_todos_prefix_and_ranking(client):
+    await client.post("/todos", json={"title": "Buy groceries", "description": "milk and bread"})
+    await client.post("/todos", json={"title": "Call plumber", "description": "about the groceries bill"})
+    await client.post("/todos", json={"title": "Write report"})
+    
+    response = await client.get("/todos/search", params={"q": "grocer"})
+    assert response.status_code == status.HTTP_200_OK
+    # Title matches outrank description matches
+    assert [todo["title"] for todo in response.json()] == ["Buy groceries", "Call plumber"]
+    
+    response = await client.get("/todos/search", params={"q": "groceries bre"})
+    assert [todo["title"] for todo in response.json()] == ["Buy groceries"]
+    
+    # Only the last word matches as a prefix
+    response = await client.get("/todos/search", params={"q": "gro bread"})
+    assert response.json() == []
+    
+    response = await client.get("/todos/search", params={"q": "nothing"})
+    assert response.json() == []
+
+@pytest.mark.asyncio
+async def test_search_index_follows_writes(client):
+    todo_id = (await client.post("/todos", json={"title": "Draft agenda"})).json()["id"]
+    await client.put(f"/todos/{todo_id}", json={"title": "Final agenda"})
+    
+    assert (await client.get("/todos/search", params={"q": "draft"})).json() == []
+    assert [todo["id"] for todo in (await client.get("/todos/search", params={"q": "final"})).json()] == [todo_id]
+    
+    await client.delete(f"/todos/{todo_id}")
+    assert (await client.get("/todos/search", params={"q": "agenda"})).json() == []
+
+@pytest.mark.asyncio
+async def test_search_todos_pagination(client):
+    for i in range(5):
+        await client.post("/todos", json={"title": f"Meeting {i}", "description": "meeting " * i})
+    
+    seen = []
+    cursors = []
+    params = {"q": "meeting", "limit": 2}
+    while True:
+        response = await client.get("/todos/search", params=params)
+        seen += [todo["id"] for todo in response.json()]
+        if "x-next-cursor" not in response.headers:
+            break
+        cursors.append(response.headers["x-next-cursor"])
+        params["cursor"] = cursors[-1]
+    assert len(seen) == len(set(seen)) == 5
+    
+    # Cursors are bound to their query
+    response = await client.get("/todos/search", params={"q": "other", "cursor": cursors[0]})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+@pytest.mark.asyncio
+async def test_search_cursor_stable_across_other_users_writes(client):
+    for i in range(6):
+        await client.post("/todos", json={"title": f"Meeting {i}", "description": "meeting " * i})
+    expected = [todo["id"] for todo in (await client.get("/todos/search", params={"q": "meeting", "limit": 100})).json()]
+    first = await client.get("/todos/search", params={"q": "meeting", "limit": 3})
+
+    # Another user's writes change the index statistics, not this user's ranks
+    with signed_in_as(OTHER_USER):
+        await client.post("/todos/batch", json={"items": [
+            {"title": "meeting meeting", "description": "meeting notes"} for _ in range(50)
+        ]})
+
+    second = await client.get(
+        "/todos/search", params={"q": "meeting", "limit": 3, "cursor": first.headers["x-next-cursor"]}
+    )
+    assert [todo["id"] for todo in first.json() + second.json()] == expected
+    assert "x-next-cursor" not in second.headers
+
+@pytest.mark.asyncio
+async def test_search_todos_rejects_query_without_terms(client):
+    response = await client.get("/todos/search", params={"q": "\"*"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+@pytest.mark.asyncio
+async def test_todo_stats_follow_writes(client):
+    response = await client.get("/todos/stats")
+    assert response.json() == {"total": 0, "active": 0, "completed": 0}
+    
+    first = (await client.post("/todos", json={"title": "First"})).json()["id"]
+    await client.post("/todos", json={"title": "Second", "completed": True})
+    await client.post("/todos/batch", json={"items": [{"title": "Third"}, {"title": "Fourth"}]})
+    await client.put(f"/todos/{first}", json={"completed": True})
+    await client.put(f"/todos/{first}", json={"title": "First, renamed"})
+    assert (await client.get("/todos/stats")).json() == {"total": 4, "active": 2, "completed": 2}
+    
+    await client.put(f"/todos/{first}", json={"completed": False})
+    await client.delete(f"/todos/{first}")
+    assert (await client.get("/todos/stats")).json() == {"total": 3, "active": 2, "completed": 1}
@@ -2,10 +2,26 @@ import pytest
 import respx
 import httpx
 from auth import TokenValidator
-from jose import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import jwk, jwt
 from fastapi import HTTPException
 import time
 
+def private_pem(private_key):
+    return private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+
+RSA_KEY = jwk.construct(private_pem(rsa.generate_private_key(public_exponent=65537, key_size=2048)), "RS256")
+EC_KEY = jwk.construct(private_pem(ec.generate_private_key(ec.SECP256R1())), "ES256")
+
+def public_jwk(private_key, kid, **extra):
+    key = private_key.public_key().to_dict()
+    key.pop("alg", None)
+    key.update(kid=kid, use="sig", **extra)
+    return key
+
 @pytest.mark.asyncio
 async def test_token_validator_discovery():
     issuer = "https://test-issuer.com"
@@ -51,7 +67,7 @@ async def test_token_validator_validate_token_success(mocker):
     # Mock JWKS
     jwks_data = {
         "keys": [
-            {"kid": "test-kid", "kty": "RSA", "n": "...", "e": "AQAB", "use": "sig"}
+            public_jwk(RSA_KEY, "test-kid")
         ]
     }
     
@@ -73,7 +89,7 @@ async def test_token_validator_validate_token_success(mocker):
 
 @pytest.mark.asyncio
 async def test_token_validator_validate_token_invalid_kid(mocker):
-    jwks_data = {"keys": [{"kid": "other-kid", "kty": "RSA", "n": "...", "e": "AQAB", "use": "sig"}]}
+    jwks_data = {"keys": [public_jwk(RSA_KEY, "other-kid")]}
     
     import auth
     auth.OIDC_ISSUER = "https://test-issuer.com"
@@ -87,3 +103,203 @@ async def test_token_validator_validate_token_invalid_kid(mocker):
     assert exc.value.status_code == 401
     assert "Public key not found in JWKS" in str(exc.value.detail)
 
+
+@pytest.mark.asyncio
+async def test_token_validator_caches_verified_tokens(mocker):
+    jwks_data = {"keys": [public_jwk(RSA_KEY, "test-kid")]}
+
+    validator = TokenValidator()
+    mocker.patch.object(validator, 'get_jwks', return_value=jwks_data)
+    mocker.patch('jose.jwt.get_unverified_header', return_value={"kid": "test-kid"})
+    decoded_payload = {"sub": "user-123", "email": "user@example.com", "exp": time.time() + 300}
+    decode = mocker.patch('jose.jwt.decode', return_value=decoded_payload)
+
+    assert await validator.validate_token("fake-token") == decoded_payload
+    assert await validator.validate_token("fake-token") == decoded_payload
+    assert decode.call_count == 1
+    assert validator.cache_info() == {"hits": 1, "misses": 1, "size": 1, "maxsize": validator.token_cache_size}
+
+@pytest.mark.asyncio
+async def test_token_validator_cache_expires_at_exp(mocker):
+    jwks_data = {"keys": [public_jwk(RSA_KEY, "test-kid")]}
+
+    validator = TokenValidator()
+    mocker.patch.object(validator, 'get_jwks', return_value=jwks_data)
+    mocker.patch('jose.jwt.get_unverified_header', return_value={"kid": "test-kid"})
+    decode = mocker.patch('jose.jwt.decode', return_value={"sub": "user-123", "exp": time.time() - 1})
+
+    await validator.validate_token("fake-token")
+    await validator.validate_token("fake-token")
+    assert decode.call_count == 2
+    assert validator.cache_hits == 0
+
+@pytest.mark.asyncio
+async def test_token_validator_cache_evicts_least_recently_used(mocker):
+    jwks_data = {"keys": [public_jwk(RSA_KEY, "test-kid")]}
+
+    validator = TokenValidator(token_cache_size=2)
+    mocker.patch.object(validator, 'get_jwks', return_value=jwks_data)
+    mocker.patch('jose.jwt.get_unverified_header', return_value={"kid": "test-kid"})
+    decode = mocker.patch('jose.jwt.decode', return_value={"sub": "user-123", "exp": time.time() + 300})
+
+    for token in ("token-a", "token-b", "token-a", "token-c", "token-a"):
+        await validator.validate_token(token)
+    assert decode.call_count == 3
+    assert validator.cache_info()["size"] == 2
+
+@pytest.mark.asyncio
+async def test_token_validator_cache_cleared_on_jwks_rotation():
+    jwks_url = "https://test-issuer.com/jwks"
+
+    import auth
+    auth.JWKS_URL = jwks_url
+
+    validator = TokenValidator()
+    validator._cache_payload("cached-token", {"sub": "user-123", "exp": time.time() + 300})
+
+    with respx.mock:
+        respx.get(jwks_url).mock(
+            return_value=httpx.Response(200, json={"keys": [{"kid": "rotated"}]})
+        )
+        await validator.get_jwks()
+    assert validator.cache_info()["size"] == 0
+
+def signed_token(private_key, kid, algorithm, **claims):
+    claims = dict({"sub": "user-123", "email": "user@example.com", "exp": time.time() + 300,
+                   "aud": "test-audience", "iss": "https://test-issuer.com"}, **claims)
+    return jwt.encode(claims, private_key, algorithm=algorithm, headers={"kid": kid})
+
+@pytest.fixture
+def oidc_settings(monkeypatch):
+    import auth
+    monkeypatch.setattr(auth, "OIDC_ISSUER", "https://test-issuer.com")
+    monkeypatch.setattr(auth, "OIDC_AUDIENCE", "test-audience")
+
+@pytest.mark.asyncio
+async def test_token_validator_verifies_rs256_and_es256(mocker, oidc_settings):
+    jwks_data = {"keys": [public_jwk(RSA_KEY, "rsa-kid"), public_jwk(EC_KEY, "ec-kid", alg="ES256")]}
+    validator = TokenValidator()
+    mocker.patch.object(validator, 'get_jwks', return_value=jwks_data)
+
+    for private_key, kid, algorithm in ((RSA_KEY, "rsa-kid", "RS256"), (EC_KEY, "ec-kid", "ES256")):
+        payload = await validator.validate_token(signed_token(private_key, kid, algorithm))
+        assert payload["sub"] == "user-123"
+
+@pytest.mark.asyncio
+async def test_token_validator_builds_key_map_once_per_jwks(mocker, oidc_settings):
+    jwks_data = {"keys": [public_jwk(RSA_KEY, "rsa-kid")]}
+    validator = TokenValidator()
+    mocker.patch.object(validator, 'get_jwks', return_value=jwks_data)
+    construct = mocker.spy(jwk, 'construct')
+
+    for user in ("a", "b", "c"):
+        await validator.validate_token(signed_token(RSA_KEY, "rsa-kid", "RS256", sub=user))
+    assert construct.call_count == 1
+
+    # A new fetch rebuilds the map
+    rotated = {"keys": [public_jwk(EC_KEY, "ec-kid")]}
+    assert set(validator.signing_keys(rotated)) == {"ec-kid"}
+
+@pytest.mark.asyncio
+async def test_token_validator_rejects_other_algorithm_for_key(mocker, oidc_settings):
+    # An EC key only verifies ES256, even if the token claims another algorithm
+    jwks_data = {"keys": [public_jwk(EC_KEY, "ec-kid")]}
+    validator = TokenValidator()
+    mocker.patch.object(validator, 'get_jwks', return_value=jwks_data)
+
+    with pytest.raises(HTTPException) as exc:
+        await validator.validate_token(signed_token(RSA_KEY, "ec-kid", "RS256"))
+    assert exc.value.status_code == 401
+
+def test_signing_keys_skip_unsupported_and_encryption_keys():
+    validator = TokenValidator()
+    keys = validator.signing_keys({"keys": [
+        public_jwk(RSA_KEY, "pss-kid", alg="PS256"),
+        dict(public_jwk(RSA_KEY, "enc-kid"), use="enc"),
+        {"kid": "broken-kid", "kty": "RSA", "n": "...", "e": "AQAB"},
+        public_jwk(RSA_KEY, "rsa-kid"),
+    ]})
+    assert list(keys) == ["rsa-kid"]
+    assert keys["rsa-kid"][0] == "RS256"
+
+async def fetch_user_row(user_id):
+    from sqlalchemy import select
+    from database import db, UserDB
+    async with db.session() as session:
+        result = await session.execute(select(UserDB).where(UserDB.id == user_id))
+        return result.scalar_one_or_none()
+
+@pytest.mark.asyncio
+async def test_user_syncer_inserts_first_seen_user_immediately():
+    from auth import UserSyncer
+    from models import AuthUser
+
+    syncer = UserSyncer()
+    await syncer.sync(AuthUser(id="new-user", email="new@example.com", name="New"))
+
+    row = await fetch_user_row("new-user")
+    assert row is not None
+    assert row.email == "new@example.com"
+
+@pytest.mark.asyncio
+async def test_user_syncer_skips_db_for_known_user(mocker):
+    from auth import UserSyncer
+    from models import AuthUser
+
+    syncer = UserSyncer()
+    user = AuthUser(id="known-user", email="known@example.com")
+    await syncer.sync(user)
+
+    upsert = mocker.patch.object(syncer, '_upsert')
+    await syncer.sync(user)
+    assert upsert.call_count == 0
+    assert await syncer.flush() == 0
+
+@pytest.mark.asyncio
+async def test_user_syncer_batches_profile_changes():
+    from auth import UserSyncer
+    from models import AuthUser
+
+    syncer = UserSyncer()
+    await syncer.sync(AuthUser(id="user-a", email="a@example.com", name="A"))
+    await syncer.sync(AuthUser(id="user-b", email="b@example.com", name="B"))
+
+    await syncer.sync(AuthUser(id="user-a", email="a@example.com", name="A renamed"))
+    await syncer.sync(AuthUser(id="user-b", email="b@example.com", name="B renamed"))
+    assert (await fetch_user_row("user-a")).name == "A"
+
+    assert await syncer.flush() == 2
+    assert (await fetch_user_row("user-a")).name == "A renamed"
+    assert (await fetch_user_row("user-b")).name == "B renamed"
+
+@pytest.mark.asyncio
+async def test_user_syncer_stop_flushes_pending_updates():
+    from auth import UserSyncer
+    from models import AuthUser
+
+    syncer = UserSyncer(flush_interval=3600)
+    syncer.start()
+    await syncer.sync(AuthUser(id="user-c", email="c@example.com"))
+    await syncer.sync(AuthUser(id="user-c", email="c@example.com", name="C"))
+    await syncer.stop()
+
+    assert (await fetch_user_row("user-c")).name == "C"
+
+@pytest.mark.asyncio
+async def test_user_syncer_writes_through_write_queue(mocker):
+    from auth import UserSyncer
+    from database import db
+    from models import AuthUser
+
+    write = mocker.spy(db, "write")
+    syncer = UserSyncer()
+    await syncer.sync(AuthUser(id="user-d", email="d@example.com"))
+    await syncer.sync(AuthUser(id="user-e", email="e@example.com"))
+    assert write.call_count == 2
+
+    # A conflicting email fails only its own row in the per-row fallback
+    await syncer.sync(AuthUser(id="user-d", email="e@example.com"))
+    await syncer.sync(AuthUser(id="user-e", email="e@example.com", name="E"))
+    assert await syncer.flush() == 1
+    assert (await fetch_user_row("user-d")).email == "d@example.com"
+    assert (await fetch_user_row("user-e")).name == "E"
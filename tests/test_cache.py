@@ -0,0 +1,129 @@
+import pytest
+
+from cache import ListCache, ENTRY_OVERHEAD_BYTES
+
+
+def test_list_cache_hit_and_miss():
+    cache = ListCache(max_bytes=10_000, ttl=60)
+    assert cache.get("user-1", "page") is None
+
+    token = cache.begin_read("user-1")
+    assert cache.put("user-1", "page", b"[]", {"ETag": '"a"'}, token)
+    entry = cache.get("user-1", "page")
+    assert entry.body == b"[]"
+    assert cache.stats()["hit_ratio"] == 0.5
+
+def test_list_cache_invalidation_is_per_user():
+    cache = ListCache(max_bytes=10_000, ttl=60)
+    for user in ("user-1", "user-2"):
+        cache.put(user, "page", b"[]", {}, cache.begin_read(user))
+
+    cache.invalidate_user("user-1")
+    assert cache.get("user-1", "page") is None
+    assert cache.get("user-2", "page") is not None
+    assert cache.stats()["entries"] == 1
+
+def test_list_cache_rejects_page_read_before_invalidation():
+    cache = ListCache(max_bytes=10_000, ttl=60)
+    token = cache.begin_read("user-1")
+    cache.invalidate_user("user-1")
+
+    assert not cache.put("user-1", "page", b"stale", {}, token)
+    assert cache.put("user-1", "page", b"fresh", {}, cache.begin_read("user-1"))
+
+def test_list_cache_memory_cap_evicts_least_recently_used():
+    cache = ListCache(max_bytes=3 * (ENTRY_OVERHEAD_BYTES + 100), ttl=60)
+    for page in ("a", "b", "c"):
+        cache.put("user-1", page, b"x" * 100, {}, cache.begin_read("user-1"))
+    cache.get("user-1", "a")
+    cache.put("user-1", "d", b"x" * 100, {}, cache.begin_read("user-1"))
+
+    assert cache.get("user-1", "b") is None
+    assert cache.get("user-1", "a") is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+def test_list_cache_entries_expire(monkeypatch):
+    import cache as cache_module
+    cache = ListCache(max_bytes=10_000, ttl=5)
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache.put("user-1", "page", b"[]", {}, cache.begin_read("user-1"))
+
+    now[0] += 6
+    assert cache.get("user-1", "page") is None
+
+def test_list_cache_disabled():
+    cache = ListCache(max_bytes=0)
+    assert not cache.put("user-1", "page", b"[]", {}, cache.begin_read("user-1"))
+    assert cache.get("user-1", "page") is None
+
+@pytest.mark.asyncio
+async def test_list_endpoint_served_from_cache(client, mocker):
+    from cache import list_cache
+    from database import db
+
+    await client.post("/todos", json={"title": "Cached"})
+    first = await client.get("/todos")
+
+    hits = list_cache.stats()["hits"]
+    session = mocker.spy(db, "read_session")
+    second = await client.get("/todos")
+    assert session.call_count == 0
+    assert second.content == first.content
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert list_cache.stats()["hits"] == hits + 1
+
+    not_modified = await client.get("/todos", headers={"If-None-Match": first.headers["ETag"]})
+    assert not_modified.status_code == 304
+    assert session.call_count == 0
+
+@pytest.mark.asyncio
+async def test_list_cache_poll_drops_pages_written_elsewhere(client):
+    from sqlalchemy import insert
+    from app import load_todo_versions
+    from cache import list_cache
+    from database import db, bump_todo_version, TodoDB
+
+    await client.post("/todos", json={"title": "First"})
+    first = await client.get("/todos")
+    assert await list_cache.poll_once(load_todo_versions) == 0
+
+    # A write handled by another worker process: committed to the shared
+    # database without invalidating this process's cache
+    async def write_elsewhere(session):
+        await bump_todo_version(session, "test-user-id")
+        await session.execute(insert(TodoDB).values(user_id="test-user-id", title="Second", version=0))
+
+    await db.write(write_elsewhere)
+    assert (await client.get("/todos")).content == first.content
+
+    assert await list_cache.poll_once(load_todo_versions) == 1
+    second = await client.get("/todos")
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert sorted(todo["title"] for todo in second.json()) == ["First", "Second"]
+
+def test_list_cache_poll_compares_oldest_cached_version():
+    import asyncio
+    cache = ListCache(max_bytes=10_000, ttl=60)
+    cache.put("user-1", "a", b"[]", {}, cache.begin_read("user-1"), version=3)
+    cache.put("user-1", "b", b"[]", {}, cache.begin_read("user-1"), version=4)
+    cache.put("user-2", "a", b"[]", {}, cache.begin_read("user-2"), version=4)
+
+    async def fetch_versions(user_ids):
+        return {"user-1": 4, "user-2": 4}
+
+    assert asyncio.run(cache.poll_once(fetch_versions)) == 1
+    assert cache.get("user-1", "b") is None
+    assert cache.get("user-2", "a") is not None
+
+@pytest.mark.asyncio
+async def test_list_cache_invalidated_by_writes(client):
+    todo = (await client.post("/todos", json={"title": "Before"})).json()
+    await client.get("/todos")
+
+    await client.put(f"/todos/{todo['id']}", json={"title": "After"})
+    assert [t["title"] for t in (await client.get("/todos")).json()] == ["After"]
+
+    await client.request("DELETE", "/todos/batch", json={"ids": [todo["id"]]})
+    assert (await client.get("/todos")).json() == []
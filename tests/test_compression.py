@@ -0,0 +1,73 @@
+import gzip
+
+import pytest
+from fastapi import status
+
+from compression import CompressedBodyCache, compressed_cache, negotiate_encoding
+
+
+def test_negotiate_encoding_prefers_highest_q_then_server_order():
+    offered = ["zstd", "br", "gzip"]
+    assert negotiate_encoding("gzip, br", offered) == "br"
+    assert negotiate_encoding("br;q=0.5, gzip", offered) == "gzip"
+    assert negotiate_encoding("*;q=0.1, gzip;q=0", offered) == "zstd"
+    assert negotiate_encoding("identity", offered) is None
+    assert negotiate_encoding("", offered) is None
+
+def test_compressed_body_cache_is_bounded():
+    cache = CompressedBodyCache(max_bytes=10)
+    cache.put('"a"', "gzip", b"123456")
+    cache.put('"b"', "gzip", b"123456")
+    assert cache.get('"a"', "gzip") is None
+    assert cache.get('"b"', "gzip") == b"123456"
+
+async def create_todos(client, count):
+    await client.post("/todos/batch", json={"items": [
+        {"title": f"Todo {i}", "description": "x" * 100} for i in range(count)
+    ]})
+
+@pytest.mark.asyncio
+async def test_large_list_is_gzipped_with_weak_etag(client):
+    await create_todos(client, 50)
+    response = await client.get("/todos", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"].startswith('W/"')
+    assert len(response.json()) == 50
+    assert int(response.headers["content-length"]) < len(response.content)
+
+    # The weak ETag still revalidates the page
+    response = await client.get(
+        "/todos", headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["etag"]}
+    )
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+@pytest.mark.asyncio
+async def test_compressed_variant_cached_by_etag(client):
+    await create_todos(client, 50)
+    compressed_cache.clear()
+    first = await client.get("/todos", headers={"Accept-Encoding": "gzip"})
+    hits = compressed_cache.hits
+    second = await client.get("/todos", headers={"Accept-Encoding": "gzip"})
+    assert compressed_cache.hits == hits + 1
+    assert second.content == first.content
+
+@pytest.mark.asyncio
+async def test_small_or_unaccepted_responses_not_compressed(client):
+    await client.post("/todos", json={"title": "Only one"})
+    response = await client.get("/todos", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+    await create_todos(client, 50)
+    response = await client.get("/todos", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert not response.headers["etag"].startswith("W/")
+
+@pytest.mark.asyncio
+async def test_gzip_body_decodes_to_identity_body(client):
+    await create_todos(client, 50)
+    plain = await client.get("/todos", headers={"Accept-Encoding": "identity"})
+    # Read the raw bytes without httpx decoding them
+    async with client.stream("GET", "/todos", headers={"Accept-Encoding": "gzip"}) as response:
+        raw = b"".join([chunk async for chunk in response.aiter_raw()])
+    assert gzip.decompress(raw) == plain.content
@@ -0,0 +1,284 @@
+import asyncio
+import pytest
+from datetime import datetime
+from sqlalchemy import event, func, select, text
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.exc import OperationalError
+
+from app import build_changes_query, build_list_query, build_search_query, encode_cursor
+from database import (
+    db, MIGRATIONS, SCHEMA_VERSION, TodoDB, bulk_todo_stats, find_todo_stats_drift, get_todo_stats,
+    get_todo_version, rebuild_todo_stats, run_migrations,
+)
+
+TEST_USER_ID = "test-user-id"
+
+
+async def explain(query) -> str:
+    sql = str(query.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+    async with db.engine.connect() as conn:
+        result = await conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))
+        return "\n".join(row[-1] for row in result)
+
+@pytest.mark.asyncio
+async def test_schema_version_applied():
+    async with db.engine.connect() as conn:
+        version = (await conn.execute(text("PRAGMA user_version"))).scalar()
+    assert version == SCHEMA_VERSION == MIGRATIONS[-1][0]
+
+@pytest.mark.asyncio
+async def test_migrations_are_idempotent():
+    async with db.engine.begin() as conn:
+        await conn.execute(text("PRAGMA user_version = 0"))
+        version = await conn.run_sync(run_migrations)
+    assert version == SCHEMA_VERSION
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("view,index", [
+    ("all", "ix_todos_user_created"),
+    ("active", "ix_todos_user_completed_created"),
+    ("completed", "ix_todos_user_completed_updated"),
+])
+@pytest.mark.parametrize("with_cursor", [False, True])
+async def test_list_queries_use_index_range_scan(view, index, with_cursor):
+    cursor = encode_cursor(view, datetime.now(), 10) if with_cursor else None
+    plan = await explain(build_list_query(TEST_USER_ID, view, 50, cursor))
+    assert f"USING INDEX {index}" in plan
+    assert "TEMP B-TREE" not in plan
+    assert "SCAN todos" not in plan
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("deleted,index", [
+    (False, "ix_todos_user_version"),
+    (True, "ix_todo_tombstones_user_version"),
+])
+@pytest.mark.parametrize("since,position", [(None, None), (3, None), (3, (5, 10))])
+async def test_change_feed_queries_use_index_range_scan(deleted, index, since, position):
+    plan = await explain(build_changes_query(TEST_USER_ID, since, 50, position, deleted=deleted))
+    assert f"INDEX {index} " in plan
+    assert "TEMP B-TREE" not in plan
+    assert "SCAN" not in plan
+
+@pytest.mark.asyncio
+async def test_export_query_uses_index_range_scan():
+    plan = await explain(
+        select(TodoDB.id).where(TodoDB.user_id == TEST_USER_ID).order_by(TodoDB.created_at.desc(), TodoDB.id.desc())
+    )
+    assert "USING COVERING INDEX ix_todos_user_created" in plan
+    assert "TEMP B-TREE" not in plan
+
+@pytest.mark.asyncio
+async def test_redundant_todo_indexes_dropped():
+    async with db.engine.connect() as conn:
+        indexes = {row[1] for row in await conn.execute(text("PRAGMA index_list(todos)"))}
+    assert indexes == {
+        "ix_todos_user_created", "ix_todos_user_completed_created",
+        "ix_todos_user_completed_updated", "ix_todos_user_version",
+    }
+
+def test_change_feed_migration_upgrades_existing_table():
+    from sqlalchemy import create_engine
+
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE todos (id INTEGER PRIMARY KEY, user_id VARCHAR(100), title VARCHAR(200), "
+            "description VARCHAR(500), completed BOOLEAN, created_at DATETIME, updated_at DATETIME)"
+        )
+        conn.exec_driver_sql("CREATE TABLE todo_tombstones (id INTEGER PRIMARY KEY, user_id VARCHAR(100), version INTEGER)")
+        conn.exec_driver_sql("INSERT INTO todos (user_id, title) VALUES ('u', 'Existing')")
+        conn.exec_driver_sql("PRAGMA user_version = 1")
+
+        assert run_migrations(conn) == SCHEMA_VERSION
+        assert conn.exec_driver_sql("SELECT version FROM todos").scalar() == 0
+        indexes = {row[1] for row in conn.exec_driver_sql("PRAGMA index_list(todos)")}
+        assert "ix_todos_user_version" in indexes
+
+def test_tombstone_migration_keys_by_user():
+    from sqlalchemy import create_engine
+
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE todos (id INTEGER PRIMARY KEY, user_id VARCHAR(100), title VARCHAR(200), "
+            "description VARCHAR(500), completed BOOLEAN, created_at DATETIME, updated_at DATETIME)"
+        )
+        conn.exec_driver_sql(
+            "CREATE TABLE todo_tombstones (id INTEGER PRIMARY KEY, user_id VARCHAR(100), "
+            "version INTEGER, deleted_at DATETIME)"
+        )
+        conn.exec_driver_sql("INSERT INTO todo_tombstones (id, user_id, version) VALUES (2, 'alice', 5)")
+        conn.exec_driver_sql("PRAGMA user_version = 1")
+
+        assert run_migrations(conn) == SCHEMA_VERSION
+        # The same todo id can now be tombstoned for two users
+        conn.exec_driver_sql("INSERT INTO todo_tombstones (id, user_id, version) VALUES (2, 'bob', 1)")
+        rows = conn.exec_driver_sql("SELECT user_id, id, version FROM todo_tombstones ORDER BY user_id").all()
+        assert [tuple(row) for row in rows] == [("alice", 2, 5), ("bob", 2, 1)]
+        indexes = {row[1] for row in conn.exec_driver_sql("PRAGMA index_list(todo_tombstones)")}
+        assert "ix_todo_tombstones_user_version" in indexes
+
+def test_pragma_settings_overrides():
+    from database import pragma_settings
+
+    settings = pragma_settings("balanced", {"DB_PRAGMA_BUSY_TIMEOUT": "10000", "DB_PRAGMA_SYNCHRONOUS": "FULL"})
+    assert settings["busy_timeout"] == 10000
+    assert settings["synchronous"] == "FULL"
+    assert settings["temp_store"] == "MEMORY"
+
+def test_pragma_settings_unknown_profile():
+    from database import pragma_settings
+
+    with pytest.raises(ValueError):
+        pragma_settings("turbo", {})
+
+@pytest.mark.asyncio
+async def test_pragma_profile_applied_to_pooled_connections():
+    settings = await db.effective_settings()
+    assert settings["journal_mode"] == "wal"
+    assert settings["busy_timeout"] == db.pragmas["busy_timeout"]
+    assert settings["synchronous"] == 1  # NORMAL
+    assert settings["temp_store"] == 2  # MEMORY
+    assert settings["pool_size"] == db.engine.pool.size()
+
+@pytest.mark.asyncio
+async def test_concurrent_writes_share_group_commits(client):
+    batches, operations = db.writer.batches, db.writer.operations
+    responses = await asyncio.gather(*(
+        client.post("/todos", json={"title": f"Todo {i}"}) for i in range(20)
+    ))
+    assert all(response.status_code == 201 for response in responses)
+    assert len({response.json()["id"] for response in responses}) == 20
+    assert db.writer.operations - operations == 20
+    assert db.writer.batches - batches < 20
+
+@pytest.mark.asyncio
+async def test_failed_write_rolls_back_only_its_savepoint():
+    async def add(session):
+        session.add(TodoDB(user_id=TEST_USER_ID, title="kept", created_at=datetime.now()))
+        await session.flush()
+    
+    async def fail(session):
+        session.add(TodoDB(user_id=TEST_USER_ID, title="discarded", created_at=datetime.now()))
+        await session.flush()
+        raise RuntimeError("boom")
+    
+    batches = db.writer.batches
+    results = await asyncio.gather(db.write(add), db.write(fail), db.write(add), return_exceptions=True)
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], RuntimeError)
+    assert db.writer.batches - batches == 1
+    
+    async with db.session() as session:
+        titles = (await session.scalars(select(TodoDB.title))).all()
+    assert titles == ["kept", "kept"]
+
+@pytest.mark.asyncio
+async def test_writer_takes_write_lock_up_front():
+    statements = []
+    
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    async def count(session):
+        return await session.scalar(select(func.count()).select_from(TodoDB))
+    
+    event.listen(db.engine.sync_engine, "before_cursor_execute", record)
+    try:
+        assert await db.write(count) == 0
+    finally:
+        event.remove(db.engine.sync_engine, "before_cursor_execute", record)
+    assert statements[0] == "BEGIN IMMEDIATE"
+
+@pytest.mark.asyncio
+async def test_read_pool_rejects_writes():
+    assert db.read_engine is not db.engine
+    async with db.read_session() as session:
+        assert (await session.execute(text("PRAGMA query_only"))).scalar() == 1
+        with pytest.raises(OperationalError, match="readonly"):
+            await session.execute(text("DELETE FROM todos"))
+    settings = await db.effective_settings()
+    assert settings["read_pool_size"] == db.read_engine.pool.size()
+
+@pytest.mark.asyncio
+async def test_single_todo_writes_use_one_statement_each(client):
+    statements = []
+    
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "todos" in statement and "todo_versions" not in statement and "todo_tombstones" not in statement:
+            statements.append(statement.split()[0])
+    
+    event.listen(db.engine.sync_engine, "before_cursor_execute", record)
+    try:
+        todo_id = (await client.post("/todos", json={"title": "One"})).json()["id"]
+        assert (await client.put(f"/todos/{todo_id}", json={"completed": True})).status_code == 200
+        assert (await client.put("/todos/999", json={"completed": True})).status_code == 404
+        assert (await client.delete(f"/todos/{todo_id}")).status_code == 204
+        assert (await client.delete(f"/todos/{todo_id}")).status_code == 404
+    finally:
+        event.remove(db.engine.sync_engine, "before_cursor_execute", record)
+    assert statements == ["INSERT", "UPDATE", "UPDATE", "DELETE", "DELETE"]
+    # The 404s rolled back their version bumps
+    async with db.session() as session:
+        assert await get_todo_version(session, TEST_USER_ID) == 3
+
+@pytest.mark.asyncio
+async def test_search_query_uses_fts_index():
+    plan = await explain(build_search_query(TEST_USER_ID, "plan", 50))
+    assert "todos_fts VIRTUAL TABLE INDEX" in plan
+    assert "SEARCH todos USING INTEGER PRIMARY KEY" in plan
+
+@pytest.mark.asyncio
+async def test_todo_stats_drift_verify_and_rebuild(client):
+    await client.post("/todos", json={"title": "One"})
+    await client.post("/todos", json={"title": "Two", "completed": True})
+    async with db.engine.begin() as conn:
+        assert await conn.run_sync(find_todo_stats_drift) == []
+        await conn.execute(text("UPDATE todo_stats SET total = 7"))
+        drift = await conn.run_sync(find_todo_stats_drift)
+    assert drift == [{
+        "user_id": TEST_USER_ID,
+        "stored": {"total": 7, "completed": 1},
+        "actual": {"total": 2, "completed": 1},
+    }]
+    
+    async with db.engine.begin() as conn:
+        await conn.run_sync(rebuild_todo_stats)
+        assert await conn.run_sync(find_todo_stats_drift) == []
+    assert (await client.get("/todos/stats")).json() == {"total": 2, "active": 1, "completed": 1}
+
+@pytest.mark.asyncio
+async def test_bulk_inserts_update_todo_stats_once(client):
+    await client.post("/todos", json={"title": "Single"})
+    await client.post("/todos/batch", json={"items": [{"title": "A", "completed": True}, {"title": "B"}]})
+    await client.post("/todos/import", content=b'{"title": "C"}\n{"title": "D", "completed": true}\n')
+
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    rows = [{"user_id": TEST_USER_ID, "title": "E", "completed": False}]
+    async def insert_rows(session):
+        async with bulk_todo_stats(session, TEST_USER_ID, rows):
+            await session.execute(TodoDB.__table__.insert(), rows)
+    
+    event.listen(db.engine.sync_engine, "before_cursor_execute", record)
+    try:
+        await db.write(insert_rows)
+    finally:
+        event.remove(db.engine.sync_engine, "before_cursor_execute", record)
+    assert sum("todo_stats " in statement for statement in statements) == 1
+
+    # A failed bulk insert leaves neither counts nor its todo_stats_bulk listing behind
+    async def fail(session):
+        async with bulk_todo_stats(session, TEST_USER_ID, rows):
+            await session.execute(TodoDB.__table__.insert(), rows)
+            raise RuntimeError("boom")
+    
+    with pytest.raises(RuntimeError):
+        await db.write(fail)
+    async with db.engine.begin() as conn:
+        assert await conn.run_sync(find_todo_stats_drift) == []
+        assert (await conn.execute(text("SELECT count(*) FROM todo_stats_bulk"))).scalar() == 0
+    async with db.session() as session:
+        assert await get_todo_stats(session, TEST_USER_ID) == (6, 2)
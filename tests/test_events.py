@@ -0,0 +1,141 @@
+import asyncio
+import json
+import pytest
+
+from events import TodoEventBroker, event_stream, format_sse, broker
+
+
+def parse_sse(chunk):
+    fields = dict(line.split(": ", 1) for line in chunk.strip().splitlines())
+    return fields["event"], json.loads(fields["data"])
+
+@pytest.mark.asyncio
+async def test_event_stream_delivers_published_events():
+    events = TodoEventBroker()
+    stream = event_stream(events, "user-1", heartbeat_interval=5)
+    assert await stream.__anext__() == ": connected\n\n"
+
+    events.publish("user-1", {"type": "deleted", "version": 3, "id": 7})
+    events.publish("user-2", {"type": "deleted", "version": 1, "id": 8})
+    chunk = await stream.__anext__()
+    assert "id: 3\n" in chunk
+    assert parse_sse(chunk) == ("deleted", {"type": "deleted", "version": 3, "id": 7})
+
+    await stream.aclose()
+    assert events.subscriber_count == 0
+
+@pytest.mark.asyncio
+async def test_event_stream_ids_only_on_last_event_of_a_version():
+    events = TodoEventBroker()
+    stream = event_stream(events, "user-1", heartbeat_interval=5)
+    await stream.__anext__()
+
+    for todo_id in (1, 2, 3):
+        events.publish("user-1", {"type": "deleted", "version": 5, "id": todo_id})
+    events.publish("user-1", {"type": "deleted", "version": 6, "id": 4})
+    chunks = [await stream.__anext__() for _ in range(4)]
+    ids = [next((line for line in chunk.splitlines() if line.startswith("id: ")), None) for chunk in chunks]
+    assert ids == [None, None, "id: 5", "id: 6"]
+    assert [parse_sse(chunk)[1]["id"] for chunk in chunks] == [1, 2, 3, 4]
+    await stream.aclose()
+
+@pytest.mark.asyncio
+async def test_event_stream_heartbeat():
+    events = TodoEventBroker()
+    stream = event_stream(events, "user-1", heartbeat_interval=0.01)
+    await stream.__anext__()
+    assert await stream.__anext__() == ": keepalive\n\n"
+    await stream.aclose()
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_gets_resync_instead_of_blocking():
+    events = TodoEventBroker(queue_size=3)
+    subscription = events.subscribe("user-1")
+    for version in range(1, 6):
+        events.publish("user-1", {"type": "deleted", "version": version, "id": version})
+
+    queued = [subscription.queue.get_nowait() for _ in range(subscription.queue.qsize())]
+    assert queued == [{"type": "resync"}, {"type": "deleted", "version": 5, "id": 5}]
+    assert subscription.dropped == 4
+
+def test_format_sse_without_version():
+    assert format_sse({"type": "resync"}) == 'event: resync\ndata: {"type":"resync"}\n\n'
+
+@pytest.mark.asyncio
+async def test_write_endpoints_publish_events(client):
+    subscription = broker.subscribe("test-user-id")
+    try:
+        todo = (await client.post("/todos", json={"title": "Streamed"})).json()
+        await client.put(f"/todos/{todo['id']}", json={"completed": True})
+        await client.delete(f"/todos/{todo['id']}")
+
+        events = [subscription.queue.get_nowait() for _ in range(3)]
+        assert [event["type"] for event in events] == ["created", "updated", "deleted"]
+        assert events[0]["todo"] == todo
+        assert events[1]["todo"]["completed"] is True
+        assert events[2]["id"] == todo["id"]
+        assert events[0]["version"] < events[1]["version"] < events[2]["version"]
+    finally:
+        broker.unsubscribe(subscription)
+
+@pytest.mark.asyncio
+async def test_poll_resyncs_streams_behind_database():
+    events = TodoEventBroker()
+    behind = events.subscribe("user-1", version=3)
+    current = events.subscribe("user-2", version=5)
+    baseline = events.subscribe("user-3")
+    database = {"user-1": 4, "user-2": 5, "user-3": 9}
+
+    async def fetch_versions(user_ids):
+        return {user_id: database[user_id] for user_id in user_ids}
+
+    assert await events.poll_once(fetch_versions) == 1
+    assert behind.queue.get_nowait() == {"type": "resync", "version": 4}
+    assert current.queue.empty() and baseline.queue.empty()
+
+    # Versions delivered through this broker are not resynced again
+    events.publish("user-1", {"type": "deleted", "version": 6, "id": 1})
+    database.update({"user-1": 6, "user-3": 10})
+    assert await events.poll_once(fetch_versions) == 1
+    assert baseline.queue.get_nowait() == {"type": "resync", "version": 10}
+
+@pytest.mark.asyncio
+async def test_write_by_other_worker_resyncs_stream(client):
+    from app import load_todo_versions
+    from database import db, bump_todo_version
+
+    await client.post("/todos", json={"title": "Before"})
+    subscription = broker.subscribe("test-user-id", version=1)
+    try:
+        # Committed by another process, so never published to this broker
+        async def write_elsewhere(session):
+            return await bump_todo_version(session, "test-user-id")
+
+        version = await db.write(write_elsewhere)
+        assert await broker.poll_once(load_todo_versions) == 1
+        assert subscription.queue.get_nowait() == {"type": "resync", "version": version}
+    finally:
+        broker.unsubscribe(subscription)
+
+@pytest.mark.asyncio
+async def test_aborted_streams_unsubscribe(client):
+    from app import app
+
+    scope = {
+        "type": "http", "method": "GET", "path": "/todos/stream", "raw_path": b"/todos/stream",
+        "root_path": "", "scheme": "http", "query_string": b"", "headers": [],
+        "client": ("test", 1), "server": ("test", 80), "http_version": "1.1",
+    }
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        # Yield so the disconnect cancels the response before the body starts
+        await asyncio.sleep(0)
+
+    before = broker.subscriber_count
+    # Clients that disconnect before the first chunk is sent
+    for _ in range(5):
+        await app(scope, receive, send)
+    assert broker.subscriber_count == before
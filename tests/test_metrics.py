@@ -0,0 +1,59 @@
+import pytest
+
+from metrics import (
+    Registry, http_request_duration, http_requests, db_pool_checkout_wait, db_statement_duration,
+)
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    latency = registry.histogram("latency_seconds", "Latency", ["route"], buckets=(0.1, 1.0))
+    latency.observe(0.05, "/a")
+    latency.observe(0.5, "/a")
+    latency.observe(5.0, "/a")
+    text = registry.render()
+    assert "# TYPE latency_seconds histogram" in text
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{route="/a",le="1"} 2' in text
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 'latency_seconds_sum{route="/a"} 5.55' in text
+    assert 'latency_seconds_count{route="/a"} 3' in text
+
+def test_label_values_are_escaped_and_names_unique():
+    registry = Registry()
+    counter = registry.counter("events_total", "Events", ["name"])
+    counter.inc('say "hi"\n')
+    assert 'events_total{name="say \\"hi\\"\\n"} 1' in registry.render()
+    with pytest.raises(ValueError):
+        registry.gauge("events_total", "Duplicate")
+
+@pytest.mark.asyncio
+async def test_requests_recorded_per_route_template(client):
+    before = http_requests.value("GET", "/todos/{todo_id}", "404")
+    latency_before = http_request_duration.count("GET", "/todos/{todo_id}")
+    await client.get("/todos/12345")
+    await client.get("/todos/67890")
+    assert http_requests.value("GET", "/todos/{todo_id}", "404") == before + 2
+    assert http_request_duration.count("GET", "/todos/{todo_id}") == latency_before + 2
+
+    unmatched = http_requests.value("GET", "<unmatched>", "404")
+    await client.get("/no/such/path")
+    assert http_requests.value("GET", "<unmatched>", "404") == unmatched + 1
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_exposes_db_timings(client):
+    await client.post("/todos", json={"title": "Measured"})
+    await client.get("/todos")
+    assert db_statement_duration.count("primary", "INSERT") > 0
+    assert db_pool_checkout_wait.count("primary") > 0
+
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "text/plain; version=0.0.4; charset=utf-8"
+    text = response.text
+    assert 'http_request_duration_seconds_bucket{method="POST",route="/todos",le="+Inf"}' in text
+    assert 'http_requests_in_progress{method="GET"} 1' in text
+    assert 'db_statement_duration_seconds_count{pool="primary",statement="INSERT"}' in text
+    assert "# TYPE db_pool_checkout_wait_seconds histogram" in text
+    assert 'cache_hits_total{cache="list"}' in text
+    assert "write_queue_operations_total" in text
@@ -0,0 +1,56 @@
+import pytest
+from fastapi import status
+
+import auth
+from slow_queries import parameter_shape, slow_query_log
+
+
+@pytest.fixture
+def record_everything(monkeypatch):
+    monkeypatch.setattr(slow_query_log, "threshold", 0.0)
+    slow_query_log.clear()
+    yield
+    slow_query_log.clear()
+
+def test_parameter_shape_hides_values():
+    assert parameter_shape(("secret", 1, 2, 3, None)) == ["str", "int*3", "NoneType"]
+    assert parameter_shape({"title": "secret"}) == {"title": "str"}
+    assert parameter_shape([("a", 1), ("b", 2)], executemany=True) == {"rows": 2, "each": ["str", "int"]}
+
+@pytest.mark.asyncio
+async def test_slow_statement_recorded_with_plan(client, record_everything, caplog):
+    await client.post("/todos", json={"title": "Top secret title"})
+    await client.get("/todos/search", params={"q": "secret"})
+
+    entries = slow_query_log.entries()
+    search = next(entry for entry in entries if "todos_fts MATCH" in entry.statement)
+    assert any("todos_fts VIRTUAL TABLE INDEX" in line for line in search.plan)
+    assert search.pool == "read"
+    assert search.parameters == ["float*4", "int", "str*4", "int", "str*6", "float*4", "int*2"]
+    assert entries[0].recorded_at >= entries[-1].recorded_at
+
+    insert = next(entry for entry in entries if entry.statement.startswith("INSERT INTO todos "))
+    assert insert.pool == "primary"
+    # Bound values never reach the log, only their types
+    assert "Top secret title" not in caplog.text
+    assert "Slow query" in caplog.text
+
+    # Transaction control statements have no plan
+    assert all(entry.plan == [] for entry in entries if entry.statement.startswith(("BEGIN", "COMMIT")))
+
+@pytest.mark.asyncio
+async def test_slow_queries_endpoint_requires_admin(client, record_everything, monkeypatch):
+    response = await client.get("/admin/slow-queries")
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    # Admins are matched on their id, never on the (possibly unverified) email
+    monkeypatch.setattr(auth, "ADMIN_USER_IDS", {"test@example.com"})
+    response = await client.get("/admin/slow-queries")
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    monkeypatch.setattr(auth, "ADMIN_USER_IDS", {"test-user-id"})
+    await client.get("/todos")
+    response = await client.get("/admin/slow-queries")
+    assert response.status_code == status.HTTP_200_OK
+    entries = response.json()
+    assert entries and {"statement", "parameters", "duration_ms", "plan", "pool", "recorded_at"} <= set(entries[0])
@@ -0,0 +1,56 @@
+import json
+import logging
+
+import pytest
+from httpx import AsyncClient
+
+from app import app
+from database import db
+from timing import ServerTimingMiddleware, format_server_timing, phase, _phases
+
+
+def parse_server_timing(value):
+    timings = {}
+    for metric in value.split(","):
+        name, _, duration = metric.strip().partition(";dur=")
+        timings[name] = float(duration)
+    return timings
+
+def test_phase_is_noop_outside_timed_request():
+    with phase("db"):
+        pass
+    assert _phases.get() is None
+
+def test_format_server_timing():
+    assert format_server_timing({"auth": 0.0012, "db": 0.0005}, 0.002) == (
+        "auth;dur=1.200, db;dur=0.500, total;dur=2.000"
+    )
+
+@pytest.mark.asyncio
+async def test_server_timing_header_and_log_record(client, caplog):
+    await client.post("/todos", json={"title": "Timed"})
+    async with AsyncClient(app=ServerTimingMiddleware(app, enabled=True), base_url="http://test") as timed:
+        with caplog.at_level(logging.INFO, logger="timing"):
+            response = await timed.get("/todos")
+
+    timings = parse_server_timing(response.headers["server-timing"])
+    assert {"db", "serialize", "total"} <= set(timings)
+    assert timings["db"] <= timings["total"]
+
+    record = next(r for r in caplog.records if hasattr(r, "server_timing")).server_timing
+    assert record["method"] == "GET" and record["path"] == "/todos" and record["status"] == 200
+    assert set(record["phases_ms"]) == {"db", "serialize"}
+    assert json.dumps(record) in caplog.text
+
+@pytest.mark.asyncio
+async def test_writes_timed_without_leaking_into_writer(client):
+    # The first timed write starts the writer task
+    async with AsyncClient(app=ServerTimingMiddleware(app, enabled=True), base_url="http://test") as timed:
+        response = await timed.post("/todos", json={"title": "Timed write"})
+    assert "write" in parse_server_timing(response.headers["server-timing"])
+
+    async def operation(session):
+        return _phases.get()
+
+    # ...without inheriting that request's phases
+    assert await db.write(operation) is None
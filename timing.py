@@ -0,0 +1,115 @@
+import json
+import logging
+import os
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() in ("true", "1", "t")
+
+# Phase name -> seconds spent in it by the current request; None outside a timed request
+_phases: ContextVar[Optional[Dict[str, float]]] = ContextVar("server_timing_phases", default=None)
+
+
+class _Phase:
+    __slots__ = ("phases", "name", "start")
+
+    def __init__(self, phases: Dict[str, float], name: str):
+        self.phases = phases
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc) -> bool:
+        self.phases[self.name] = self.phases.get(self.name, 0.0) + time.perf_counter() - self.start
+        return False
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+def phase(name: str):
+    """
+    Time a block as phase `name` of the current request.
+
+    Repeated phases add up. Outside a timed request (timing disabled,
+    background tasks, the writer task) this is a shared no-op.
+    """
+    phases = _phases.get()
+    if phases is None:
+        return _NULL_PHASE
+    return _Phase(phases, name)
+
+
+def record_phase(name: str, seconds: float) -> None:
+    """Add an already measured duration to phase `name` of the current request"""
+    phases = _phases.get()
+    if phases is not None:
+        phases[name] = phases.get(name, 0.0) + seconds
+
+
+def format_server_timing(phases: Dict[str, float], total: float) -> str:
+    """Render phases as a Server-Timing header value, in milliseconds"""
+    metrics = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in phases.items()]
+    metrics.append(f"total;dur={total * 1000:.3f}")
+    return ", ".join(metrics)
+
+
+class ServerTimingMiddleware:
+    """
+    Attribute each request's latency to phases and report the breakdown.
+
+    The Server-Timing header covers the phases finished before the response
+    starts, and `total` is the time up to that point. After the response
+    completes, one log record gives the final breakdown, which includes
+    the body of streamed responses.
+    """
+    def __init__(self, app: ASGIApp, enabled: bool = SERVER_TIMING_ENABLED):
+        self.app = app
+        self.enabled = enabled
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+        phases: Dict[str, float] = {}
+        token = _phases.set(phases)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", format_server_timing(phases, time.perf_counter() - start))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _phases.reset(token)
+            record = {
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "total_ms": round((time.perf_counter() - start) * 1000, 3),
+                "phases_ms": {name: round(seconds * 1000, 3) for name, seconds in phases.items()},
+            }
+            logger.info("Request timing %s", json.dumps(record), extra={"server_timing": record})